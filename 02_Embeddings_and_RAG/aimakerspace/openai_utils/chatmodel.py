@@ -1,23 +1,40 @@
-from openai import OpenAI
+from typing import Any, AsyncIterator, Optional
+
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
 import os
 
+from aimakerspace.openai_utils.client_pool import ClientPool, default_pool
+
 load_dotenv()
 
 
 class ChatOpenAI:
-    def __init__(self, model_name: str = "gpt-4.1-mini"):
+    """Chat completions over the shared, connection-pooled OpenAI clients."""
+
+    def __init__(
+        self, model_name: str = "gpt-4.1-mini", pool: Optional[ClientPool] = None
+    ):
         self.model_name = model_name
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         if self.openai_api_key is None:
             raise ValueError("OPENAI_API_KEY is not set")
 
+        self.pool = pool or default_pool()
+
+    @property
+    def client(self) -> OpenAI:
+        return self.pool.sync_client()
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        return self.pool.async_client()
+
     def run(self, messages, text_only: bool = True, **kwargs):
         if not isinstance(messages, list):
             raise ValueError("messages must be a list")
 
-        client = OpenAI()
-        response = client.chat.completions.create(
+        response = self.client.chat.completions.create(
             model=self.model_name, messages=messages, **kwargs
         )
 
@@ -25,3 +42,29 @@ class ChatOpenAI:
             return response.choices[0].message.content
 
         return response
+
+    async def arun(self, messages, text_only: bool = True, **kwargs):
+        if not isinstance(messages, list):
+            raise ValueError("messages must be a list")
+
+        response = await self.async_client.chat.completions.create(
+            model=self.model_name, messages=messages, **kwargs
+        )
+
+        if text_only:
+            return response.choices[0].message.content
+
+        return response
+
+    async def astream(self, messages, **kwargs: Any) -> AsyncIterator[str]:
+        if not isinstance(messages, list):
+            raise ValueError("messages must be a list")
+
+        stream = await self.async_client.chat.completions.create(
+            model=self.model_name, messages=messages, stream=True, **kwargs
+        )
+
+        async for chunk in stream:
+            content = chunk.choices[0].delta.content
+            if content is not None:
+                yield content
@@ -0,0 +1,145 @@
+import asyncio
+import importlib.util
+import threading
+import weakref
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional ``h2`` package (``pip install httpx[http2]``)."""
+
+    return importlib.util.find_spec("h2") is not None
+
+
+class ClientPool:
+    """Shared OpenAI clients on one pooled, keep-alive HTTP transport.
+
+    Every :class:`ChatOpenAI` and :class:`EmbeddingModel` built on the same
+    pool reuses its connections, so requests skip the TCP/TLS handshake.
+    HTTP/2 is used when ``h2`` is installed unless ``http2`` says otherwise.
+    Async clients are created per event loop, because pooled connections
+    cannot outlive the loop that opened them, and are closed when that loop
+    shuts down its async generators (as ``asyncio.run`` does) or on
+    :meth:`aclose`. Outside a running loop one unbound async client is
+    handed out, as a plain ``AsyncOpenAI()`` would be.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+        http2: Optional[bool] = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=min(timeout, 10.0))
+        self.http2 = http2_available() if http2 is None else http2
+        self._lock = threading.Lock()
+        self._sync_clients: Dict[Optional[int], OpenAI] = {}
+        # Event loop -> {max_retries: client}; entries vanish with the loop.
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        # Event loop -> async generator whose ``finally`` closes its clients.
+        self._closers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._unbound_clients: Dict[Optional[int], AsyncOpenAI] = {}
+
+    def sync_client(self, max_retries: Optional[int] = None) -> OpenAI:
+        """Return the pool's sync client, optionally with its own retry count."""
+
+        with self._lock:
+            if None not in self._sync_clients:
+                self._sync_clients[None] = OpenAI(
+                    http_client=httpx.Client(
+                        limits=self.limits, timeout=self.timeout, http2=self.http2
+                    )
+                )
+            if max_retries not in self._sync_clients:
+                self._sync_clients[max_retries] = self._sync_clients[None].with_options(
+                    max_retries=max_retries
+                )
+            return self._sync_clients[max_retries]
+
+    def async_client(self, max_retries: Optional[int] = None) -> AsyncOpenAI:
+        """Return the async client for the running event loop."""
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        with self._lock:
+            if loop is None:
+                clients = self._unbound_clients
+            else:
+                clients = self._async_clients.setdefault(loop, {})
+            if None not in clients:
+                clients[None] = AsyncOpenAI(
+                    http_client=httpx.AsyncClient(
+                        limits=self.limits, timeout=self.timeout, http2=self.http2
+                    )
+                )
+                if loop is not None:
+                    self._closers[loop] = self._start_closer(clients[None])
+            if max_retries not in clients:
+                clients[max_retries] = clients[None].with_options(
+                    max_retries=max_retries
+                )
+            return clients[max_retries]
+
+    async def aclose(self) -> None:
+        """Close the running loop's async clients now instead of at shutdown."""
+
+        with self._lock:
+            closer = self._closers.get(asyncio.get_running_loop())
+        if closer is not None:
+            await closer.aclose()
+
+    def close(self) -> None:
+        """Close the sync transport; async ones are closed with their loop."""
+
+        with self._lock:
+            client = self._sync_clients.get(None)
+            if client is not None:
+                client.close()
+            self._sync_clients.clear()
+
+    def _start_closer(self, client: AsyncOpenAI) -> AsyncIterator[None]:
+        # The running loop registers the generator on its first step and
+        # finalizes it in shutdown_asyncgens, which runs the ``finally``
+        # while the loop can still await the close.
+        closer = self._close_on_shutdown(client)
+        try:
+            closer.__anext__().send(None)
+        except StopIteration:
+            pass
+        return closer
+
+    async def _close_on_shutdown(self, client: AsyncOpenAI) -> AsyncIterator[None]:
+        try:
+            yield
+        finally:
+            loop = asyncio.get_running_loop()
+            with self._lock:
+                self._async_clients.pop(loop, None)
+                self._closers.pop(loop, None)
+            await client.close()
+
+
+_default_pool: Optional[ClientPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool() -> ClientPool:
+    """Return the process-wide pool used when no pool is passed explicitly."""
+
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ClientPool()
+        return _default_pool
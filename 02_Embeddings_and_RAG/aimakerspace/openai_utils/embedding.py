@@ -1,17 +1,33 @@
 from dotenv import load_dotenv
 from openai import AsyncOpenAI, OpenAI
 import openai
-from typing import List
+from typing import List, Optional
 import os
 import asyncio
+from aimakerspace.openai_utils.client_pool import ClientPool, default_pool
+from aimakerspace.openai_utils.rate_limit import (
+    AsyncTokenBucket,
+    call_with_retries,
+    estimate_tokens,
+    plan_batches,
+)
 
 
 class EmbeddingModel:
-    def __init__(self, embeddings_model_name: str = "text-embedding-3-small", batch_size: int = 1024):
+    def __init__(
+        self,
+        embeddings_model_name: str = "text-embedding-3-small",
+        batch_size: int = 1024,
+        max_batch_tokens: int = 250_000,
+        max_concurrency: int = 4,
+        tokens_per_minute: Optional[int] = None,
+        max_retries: int = 6,
+        pool: Optional[ClientPool] = None,
+    ):
         load_dotenv()
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        self.async_client = AsyncOpenAI()
-        self.client = OpenAI()
+        # Connections are shared with ChatOpenAI through the client pool.
+        self.pool = pool or default_pool()
 
         if self.openai_api_key is None:
             raise ValueError(
@@ -19,17 +35,38 @@ class EmbeddingModel:
             )
         self.embeddings_model_name = embeddings_model_name
         self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._token_bucket = AsyncTokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    @property
+    def client(self) -> OpenAI:
+        return self.pool.sync_client()
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        # Retries for async batches are handled per batch by call_with_retries.
+        return self.pool.async_client(max_retries=0)
 
     async def async_get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
-        batches = [list_of_text[i:i + self.batch_size] for i in range(0, len(list_of_text), self.batch_size)]
-        
-        async def process_batch(batch):
+        # Batches are bounded by estimated tokens as well as item count
+        batches = plan_batches(list(list_of_text), self.max_batch_tokens, self.batch_size)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def request(batch):
+            if self._token_bucket is not None:
+                await self._token_bucket.acquire(sum(estimate_tokens(text) for text in batch))
             embedding_response = await self.async_client.embeddings.create(
                 input=batch, model=self.embeddings_model_name
             )
             return [embeddings.embedding for embeddings in embedding_response.data]
-        
-        # Use asyncio.gather to process all batches concurrently
+
+        async def process_batch(batch):
+            # Cap in-flight requests; a failed batch is retried on its own
+            async with semaphore:
+                return await call_with_retries(lambda: request(batch), max_retries=self.max_retries)
+
         results = await asyncio.gather(*[process_batch(batch) for batch in batches])
         
         # Flatten the results
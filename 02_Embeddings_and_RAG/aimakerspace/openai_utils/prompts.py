@@ -1,5 +1,8 @@
+import operator
 import re
-from typing import Dict, List, Any, Optional, Union, Callable
+import string
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Union, Callable, Tuple
 from abc import ABC, abstractmethod
 
 
@@ -8,6 +11,136 @@ class PromptValidationError(Exception):
     pass
 
 
+_VARIABLE_PATTERN = re.compile(r"\{([^}]+)\}")
+_CONDITIONAL_VAR_PATTERN = re.compile(r'\{([^{}]+)\}')
+_CONDITIONAL_PATTERN = re.compile(r'\{if\s+([^}]+)\}(.*?)(?:\{else\}(.*?))?\{/if\}', re.DOTALL)
+# A str.format field that resolves to a plain keyword (no attribute/index access)
+_FIELD_NAME = re.compile(r"[^.\[\]]+")
+_COMPARISONS = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '!=': operator.ne,
+}
+_FORMATTER = string.Formatter()
+
+# Compiled segments: a literal string, or a (kind, ...) tuple for variables
+# ("var", name) and conditionals ("if", condition, true_segments, false_segments)
+Segment = Union[str, Tuple[Any, ...]]
+
+
+@lru_cache(maxsize=256)
+def _input_variables(template: str) -> Tuple[str, ...]:
+    return tuple(_VARIABLE_PATTERN.findall(template))
+
+
+@lru_cache(maxsize=256)
+def compile_format_template(template: str) -> Tuple[Segment, ...]:
+    """
+    Parse a ``str.format``-style template once into literal and variable segments.
+
+    Escaped braces are resolved exactly as ``str.format`` would. Results are
+    cached by template string.
+
+    :raises PromptValidationError: If the template is malformed or uses
+        positional fields, attribute/index access, conversions or format specs
+    """
+    try:
+        parsed = list(_FORMATTER.parse(template))
+    except ValueError as e:
+        raise PromptValidationError(f"Invalid template syntax: {e}")
+
+    segments: List[Segment] = []
+    for literal, field, format_spec, conversion in parsed:
+        if literal:
+            segments.append(literal)
+        if field is None:
+            continue
+        if conversion or format_spec or field.isdigit() or not _FIELD_NAME.fullmatch(field):
+            raise PromptValidationError(f"Invalid template syntax: unsupported field {{{field}}}")
+        segments.append(("var", field))
+    return tuple(segments)
+
+
+class _Condition:
+    """A ``{if ...}`` condition, parsed once and evaluated per render"""
+
+    __slots__ = ("source", "kind", "left", "right", "compare")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.kind = "truthy"
+        self.left = self.right = ""
+        self.compare: Optional[Callable[[Any, Any], bool]] = None
+
+        # Mirrors the original evaluation order: equality first, then the
+        # first comparison operator whose split yields exactly two sides
+        parts = source.split('==')
+        if len(parts) == 2:
+            self.kind = "equals"
+            self.left = parts[0].strip()
+            self.right = parts[1].strip().strip('"').strip("'")
+            return
+        for symbol, compare in _COMPARISONS.items():
+            if symbol in source:
+                parts = source.split(symbol)
+                if len(parts) == 2:
+                    self.kind = "compare"
+                    self.left, self.right = parts[0].strip(), parts[1].strip()
+                    self.compare = compare
+                    return
+
+    def evaluate(self, context: Dict[str, Any]) -> bool:
+        if self.source in context:
+            return bool(context[self.source])
+        if self.kind == "equals":
+            return str(context.get(self.left, "")) == self.right
+        if self.kind == "compare":
+            try:
+                return self.compare(float(context.get(self.left, 0)), float(self.right))
+            except (ValueError, TypeError):
+                return False
+        return bool(context.get(self.source, False))
+
+
+def _variable_segments(text: str) -> List[Segment]:
+    segments: List[Segment] = []
+    position = 0
+    for match in _CONDITIONAL_VAR_PATTERN.finditer(text):
+        if match.start() > position:
+            segments.append(text[position:match.start()])
+        segments.append(("var", match.group(1)))
+        position = match.end()
+    if position < len(text):
+        segments.append(text[position:])
+    return segments
+
+
+@lru_cache(maxsize=256)
+def compile_conditional_template(template: str) -> Tuple[Segment, ...]:
+    """
+    Parse a :class:`ConditionalPrompt` template once into a segment tree.
+
+    Conditionals become ``("if", condition, true_segments, false_segments)``
+    nodes whose branches are already stripped and split into variables.
+    Results are cached by template string.
+    """
+    segments: List[Segment] = []
+    position = 0
+    for match in _CONDITIONAL_PATTERN.finditer(template):
+        segments.extend(_variable_segments(template[position:match.start()]))
+        segments.append((
+            "if",
+            _Condition(match.group(1).strip()),
+            tuple(_variable_segments(match.group(2).strip())),
+            tuple(_variable_segments(match.group(3).strip() if match.group(3) else "")),
+        ))
+        position = match.end()
+    segments.extend(_variable_segments(template[position:]))
+    return tuple(segments)
+
+
 class ConditionalPrompt:
     """Enhanced prompt with conditional logic support"""
     
@@ -27,83 +160,45 @@ class ConditionalPrompt:
         self.prompt = prompt
         self.strict = strict
         self.defaults = defaults or {}
-        self._var_pattern = re.compile(r'\{([^{}]+)\}')
-        self._conditional_pattern = re.compile(r'\{if\s+([^}]+)\}(.*?)(?:\{else\}(.*?))?\{/if\}', re.DOTALL)
         
     def format_prompt(self, **kwargs) -> str:
-        """Format prompt with conditional logic evaluation"""
+        """
+        Format prompt with conditional logic evaluation.
+
+        The template is compiled once (and cached) into a segment tree, then
+        rendered in a single pass; substituted values are never re-scanned
+        for placeholders.
+        """
         merged_kwargs = {**self.defaults, **kwargs}
-        
-        # Process conditional statements
-        result = self._process_conditionals(self.prompt, merged_kwargs)
-        
-        # Process regular variables
-        variables = self._var_pattern.findall(result)
-        
-        if self.strict:
-            missing_vars = set(variables) - set(merged_kwargs.keys())
-            if missing_vars:
-                raise PromptValidationError(f"Missing required variables: {missing_vars}")
-        
-        # Format remaining variables
-        for var in variables:
-            value = merged_kwargs.get(var, "")
-            result = result.replace(f"{{{var}}}", str(value))
-            
-        return result
-    
-    def _process_conditionals(self, text: str, context: Dict[str, Any]) -> str:
-        """Process conditional statements in the text"""
-        def replace_conditional(match):
-            condition = match.group(1).strip()
-            true_content = match.group(2).strip()
-            false_content = match.group(3).strip() if match.group(3) else ""
-            
-            # Evaluate condition
-            try:
-                # Simple evaluation - check if variable exists and is truthy
-                if condition in context:
-                    condition_result = bool(context[condition])
-                else:
-                    # Try to evaluate as a simple expression
-                    condition_result = self._evaluate_condition(condition, context)
-                
-                return true_content if condition_result else false_content
-            except Exception:
-                return false_content
-        
-        return self._conditional_pattern.sub(replace_conditional, text)
+        parts: List[str] = []
+        missing_vars = set()
+        self._render(compile_conditional_template(self.prompt), merged_kwargs, parts, missing_vars)
+
+        if self.strict and missing_vars:
+            raise PromptValidationError(f"Missing required variables: {missing_vars}")
+
+        return "".join(parts)
+
+    def _render(self, segments, context: Dict[str, Any], parts: List[str], missing_vars: set) -> None:
+        for segment in segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+            elif segment[0] == "var":
+                name = segment[1]
+                if name not in context:
+                    missing_vars.add(name)
+                parts.append(str(context.get(name, "")))
+            else:
+                _, condition, true_segments, false_segments = segment
+                try:
+                    branch = true_segments if condition.evaluate(context) else false_segments
+                except Exception:
+                    branch = false_segments
+                self._render(branch, context, parts, missing_vars)
     
     def _evaluate_condition(self, condition: str, context: Dict[str, Any]) -> bool:
         """Evaluate simple conditions like 'var > 5' or 'var == "value"'"""
-        # Simple equality check
-        if '==' in condition:
-            parts = condition.split('==')
-            if len(parts) == 2:
-                left = parts[0].strip()
-                right = parts[1].strip().strip('"').strip("'")
-                return str(context.get(left, "")) == right
-        
-        # Simple comparison
-        for op in ['>', '<', '>=', '<=', '!=']:
-            if op in condition:
-                parts = condition.split(op)
-                if len(parts) == 2:
-                    left = parts[0].strip()
-                    right = parts[1].strip()
-                    try:
-                        left_val = float(context.get(left, 0))
-                        right_val = float(right)
-                        if op == '>': return left_val > right_val
-                        elif op == '<': return left_val < right_val
-                        elif op == '>=': return left_val >= right_val
-                        elif op == '<=': return left_val <= right_val
-                        elif op == '!=': return left_val != right_val
-                    except (ValueError, TypeError):
-                        return False
-        
-        # Default: check if variable exists and is truthy
-        return bool(context.get(condition, False))
+        return _Condition(condition).evaluate(context)
 
 
 class BasePrompt:
@@ -118,16 +213,12 @@ class BasePrompt:
         self.prompt = prompt
         self.strict = strict
         self.defaults = defaults or {}
-        self._pattern = re.compile(r"\{([^}]+)\}")
+        self._pattern = _VARIABLE_PATTERN
         self._validate_template()
 
     def _validate_template(self) -> None:
-        """Validates the template syntax"""
-        try:
-            test_vars = {var: "test" for var in self.get_input_variables()}
-            self.prompt.format(**test_vars)
-        except (KeyError, ValueError) as e:
-            raise PromptValidationError(f"Invalid template syntax: {e}")
+        """Validates the template syntax by compiling it"""
+        compile_format_template(self.prompt)
 
     def format_prompt(self, **kwargs) -> str:
         """
@@ -137,21 +228,24 @@ class BasePrompt:
         :return: The formatted prompt string
         :raises PromptValidationError: If strict mode and required variables are missing
         """
-        variables = self.get_input_variables()
         merged_kwargs = {**self.defaults, **kwargs}
         
         if self.strict:
-            missing_vars = set(variables) - set(merged_kwargs.keys())
+            missing_vars = set(_input_variables(self.prompt)) - set(merged_kwargs.keys())
             if missing_vars:
                 raise PromptValidationError(f"Missing required variables: {missing_vars}")
         
-        # Use defaults for missing variables
-        format_dict = {var: merged_kwargs.get(var, self.defaults.get(var, "")) for var in variables}
-        
+        # Compiled once per template string; missing variables render as ""
+        parts = []
         try:
-            return self.prompt.format(**format_dict)
+            for segment in compile_format_template(self.prompt):
+                if isinstance(segment, str):
+                    parts.append(segment)
+                else:
+                    parts.append(format(merged_kwargs.get(segment[1], "")))
         except (KeyError, ValueError) as e:
             raise PromptValidationError(f"Error formatting prompt: {e}")
+        return "".join(parts)
 
     def get_input_variables(self) -> List[str]:
         """
@@ -159,7 +253,7 @@ class BasePrompt:
 
         :return: List of input variable names
         """
-        return self._pattern.findall(self.prompt)
+        return list(_input_variables(self.prompt))
     
     def validate_inputs(self, **kwargs) -> Dict[str, List[str]]:
         """
@@ -330,6 +424,61 @@ class MessageAdapter:
         }
 
 
+def benchmark_prompt_rendering(context_chars: int = 16_000, repeat: int = 2_000) -> Dict[str, float]:
+    """
+    Time compiled rendering against per-call parsing on a RAG-sized prompt.
+
+    The baselines re-implement the previous behaviour: ``BasePrompt`` ran the
+    placeholder regex and ``str.format`` on every call, and
+    ``ConditionalPrompt`` re-ran the conditional regex and made one
+    ``str.replace`` pass over the whole string per variable.
+
+    :param context_chars: Size of the retrieved context substituted into the prompt
+    :param repeat: Number of renders timed per implementation
+    :return: Mean microseconds per render for each implementation
+    """
+    import timeit
+
+    template = (
+        "Answer in a {style} tone for {user}.\n"
+        "{if include_scores}Scores: {scores}{else}No scores.{/if}\n"
+        "Context:\n{context}\n\nQuestion: {question}"
+    )
+    values = {
+        "style": "concise",
+        "user": "analyst",
+        "include_scores": True,
+        "scores": "0.91, 0.88",
+        "context": ("lorem ipsum " * (context_chars // 12))[:context_chars],
+        "question": "What changed?",
+    }
+    base_template = _CONDITIONAL_PATTERN.sub("", template)
+
+    def legacy_base() -> str:
+        variables = _VARIABLE_PATTERN.findall(base_template)
+        return base_template.format(**{var: values.get(var, "") for var in variables})
+
+    def legacy_conditional() -> str:
+        def replace(match):
+            branch = match.group(2) if _Condition(match.group(1).strip()).evaluate(values) else (match.group(3) or "")
+            return branch.strip()
+
+        result = _CONDITIONAL_PATTERN.sub(replace, template)
+        for var in _CONDITIONAL_VAR_PATTERN.findall(result):
+            result = result.replace(f"{{{var}}}", str(values.get(var, "")))
+        return result
+
+    base_prompt = BasePrompt(base_template)
+    conditional_prompt = ConditionalPrompt(template)
+    timings = {
+        "base_legacy": legacy_base,
+        "base_compiled": lambda: base_prompt.format_prompt(**values),
+        "conditional_legacy": legacy_conditional,
+        "conditional_compiled": lambda: conditional_prompt.format_prompt(**values),
+    }
+    return {name: 1e6 * timeit.timeit(render, number=repeat) / repeat for name, render in timings.items()}
+
+
 if __name__ == "__main__":
     # Basic usage
     prompt = BasePrompt("Hello {name}, you are {age} years old")
@@ -372,3 +521,6 @@ if __name__ == "__main__":
         {"role": "user", "content": "Hello!"}
     ]
     print("Anthropic format:", MessageAdapter.to_anthropic(messages))
+
+    # Rendering benchmark (microseconds per call)
+    print(benchmark_prompt_rendering())
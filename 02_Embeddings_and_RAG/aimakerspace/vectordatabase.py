@@ -1,6 +1,5 @@
 import numpy as np
-from collections import defaultdict
-from typing import List, Tuple, Callable
+from typing import Dict, List, Optional, Tuple, Callable
 from aimakerspace.openai_utils.embedding import EmbeddingModel
 import asyncio
 
@@ -13,13 +12,68 @@ def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
     return dot_product / (norm_a * norm_b)
 
 
+def _normalize_rows(matrix: np.array) -> Tuple[np.array, np.array]:
+    """Scales rows to unit length, leaving zero rows as zeros."""
+    norms = np.linalg.norm(matrix, axis=1)
+    safe_norms = np.where(norms == 0, 1.0, norms)
+    return matrix / safe_norms[:, None], norms
+
+
+def _top_k_indices(scores: np.array, k: int) -> np.array:
+    """Indices of the k largest scores, best first, via a partial sort."""
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
 class VectorDatabase:
-    def __init__(self, embedding_model: EmbeddingModel = None):
-        self.vectors = defaultdict(np.array)
+    def __init__(self, embedding_model: EmbeddingModel = None, initial_capacity: int = 1024):
         self.embedding_model = embedding_model or EmbeddingModel()
+        # Unit-length float32 rows plus their original norms; grown by doubling.
+        self._matrix: Optional[np.array] = None
+        self._norms: Optional[np.array] = None
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._initial_capacity = initial_capacity
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def vectors(self) -> Dict[str, np.array]:
+        return {key: self.retrieve_from_key(key) for key in self._keys}
 
     def insert(self, key: str, vector: np.array) -> None:
-        self.vectors[key] = vector
+        self.insert_many([key], [vector])
+
+    def insert_many(self, keys: List[str], vectors: List[np.array]) -> None:
+        if len(keys) == 0:
+            return
+        batch = np.asarray(vectors, dtype=np.float32)
+        if batch.ndim != 2 or batch.shape[0] != len(keys):
+            raise ValueError("keys and vectors must have the same length")
+
+        if self._matrix is None:
+            self._matrix = np.zeros((self._initial_capacity, batch.shape[1]), dtype=np.float32)
+            self._norms = np.zeros(self._initial_capacity, dtype=np.float32)
+        elif batch.shape[1] != self._matrix.shape[1]:
+            raise ValueError(
+                f"Vector has dimension {batch.shape[1]}, expected {self._matrix.shape[1]}"
+            )
+
+        rows = []
+        for key in keys:
+            if key not in self._rows:
+                self._rows[key] = len(self._keys)
+                self._keys.append(key)
+            rows.append(self._rows[key])
+
+        self._reserve(len(self._keys))
+        normalized, norms = _normalize_rows(batch)
+        self._matrix[rows] = normalized
+        self._norms[rows] = norms
 
     def search(
         self,
@@ -27,11 +81,21 @@ class VectorDatabase:
         k: int,
         distance_measure: Callable = cosine_similarity,
     ) -> List[Tuple[str, float]]:
-        scores = [
-            (key, distance_measure(query_vector, vector))
-            for key, vector in self.vectors.items()
-        ]
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+        if not self._keys:
+            return []
+
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if distance_measure is cosine_similarity:
+            # One BLAS matrix-vector product over the pre-normalized matrix.
+            query_norm = np.linalg.norm(query_vector)
+            scores = self._matrix[: len(self._keys)] @ query_vector
+            scores = scores / query_norm if query_norm else np.zeros_like(scores)
+        else:
+            scores = np.array(
+                [distance_measure(query_vector, self._matrix[row] * self._norms[row])
+                 for row in range(len(self._keys))]
+            )
+        return [(self._keys[row], float(scores[row])) for row in _top_k_indices(scores, k)]
 
     def search_by_text(
         self,
@@ -45,14 +109,28 @@ class VectorDatabase:
         return [result[0] for result in results] if return_as_text else results
 
     def retrieve_from_key(self, key: str) -> np.array:
-        return self.vectors.get(key, None)
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        return self._matrix[row] * self._norms[row]
 
     async def abuild_from_list(self, list_of_text: List[str]) -> "VectorDatabase":
         embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
-        for text, embedding in zip(list_of_text, embeddings):
-            self.insert(text, np.array(embedding))
+        self.insert_many(list_of_text, embeddings)
         return self
 
+    def _reserve(self, size: int) -> None:
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+        matrix[: self._matrix.shape[0]] = self._matrix
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[: self._norms.shape[0]] = self._norms
+        self._matrix, self._norms = matrix, norms
+
 
 if __name__ == "__main__":
     list_of_text = [
@@ -0,0 +1,285 @@
+import time
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+
+from aimakerspace.vectordatabase import _normalize_rows, _top_k_indices
+
+if TYPE_CHECKING:
+    from aimakerspace.vectordatabase import VectorDatabase
+
+# ``score_rows(query, rows)`` scores one unit query against rows of the owner.
+RowScorer = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+class IVFIndex:
+    """Inverted-file (IVF-flat) approximate nearest-neighbour index.
+
+    Unit-length vectors are partitioned into ``n_lists`` cells by spherical
+    k-means. A query scores the centroids, then scans only the vectors in its
+    ``nprobe`` closest cells; raising ``nprobe`` trades speed for recall.
+
+    The index stores row numbers only and scores candidates through the owning
+    :class:`~aimakerspace.vectordatabase.VectorDatabase`, which trains
+    it once ``min_train_size`` vectors have been inserted and searches exactly
+    until then.
+    """
+
+    def __init__(
+        self,
+        n_lists: Optional[int] = None,
+        nprobe: int = 8,
+        min_train_size: int = 1024,
+        n_iter: int = 20,
+        seed: int = 0,
+    ):
+        if nprobe <= 0:
+            raise ValueError("nprobe must be a positive integer")
+        if n_lists is not None and n_lists <= 0:
+            raise ValueError("n_lists must be a positive integer")
+
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._list_arrays: List[Optional[np.ndarray]] = []
+        self._assignments = np.empty(0, dtype=np.intp)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def fit(self, vectors: np.ndarray) -> None:
+        """Train the coarse quantizer on ``vectors`` and index all of them."""
+
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(vectors.shape[0])))
+        n_lists = min(n_lists, vectors.shape[0])
+        self.centroids = self._kmeans(vectors, n_lists)
+        self._lists = [[] for _ in range(n_lists)]
+        self._list_arrays = [None] * n_lists
+        self._assignments = np.full(0, -1, dtype=np.intp)
+        self.add(np.arange(vectors.shape[0]), vectors)
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Assign (or re-assign) ``rows`` holding unit ``vectors`` to cells."""
+
+        if not self.is_trained:
+            return
+
+        rows = np.asarray(rows, dtype=np.intp)
+        self._grow_assignments(int(rows.max()) + 1)
+        cells = self._nearest_centroids(vectors)
+        for row, cell in zip(rows.tolist(), cells.tolist()):
+            previous = self._assignments[row]
+            if previous == cell:
+                continue
+            if previous >= 0:
+                self._lists[previous].remove(row)
+                self._list_arrays[previous] = None
+            self._lists[cell].append(row)
+            self._list_arrays[cell] = None
+            self._assignments[row] = cell
+
+    def remove(self, rows: Iterable[int]) -> None:
+        """Drop ``rows`` from whichever cells they are assigned to."""
+
+        for row in rows:
+            if row >= self._assignments.shape[0] or self._assignments[row] < 0:
+                continue
+            cell = self._assignments[row]
+            self._lists[cell].remove(row)
+            self._list_arrays[cell] = None
+            self._assignments[row] = -1
+
+    def compact(self, kept_rows: np.ndarray) -> None:
+        """Renumber rows after the owner packed ``kept_rows`` to the front."""
+
+        if kept_rows.shape[0]:
+            self._grow_assignments(int(kept_rows.max()) + 1)
+        assignments = self._assignments[kept_rows]
+        self._assignments = assignments.copy()
+        self._lists = [[] for _ in self._lists]
+        for row, cell in enumerate(assignments.tolist()):
+            if cell >= 0:
+                self._lists[cell].append(row)
+        self._list_arrays = [None] * len(self._lists)
+
+    def search(
+        self, score_rows: RowScorer, queries: np.ndarray, k: int
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Return ``(rows, scores)`` of the top ``k`` candidates per unit query."""
+
+        probes = _top_k_indices(queries @ self.centroids.T, self.nprobe)
+        results: List[Tuple[np.ndarray, np.ndarray]] = []
+        for query, cells in zip(queries, probes):
+            rows = np.concatenate([self._list_array(cell) for cell in cells])
+            scores = score_rows(query, rows)
+            best = _top_k_indices(scores, k)
+            results.append((rows[best], scores[best]))
+        return results
+
+    def _list_array(self, cell: int) -> np.ndarray:
+        array = self._list_arrays[cell]
+        if array is None:
+            array = np.asarray(self._lists[cell], dtype=np.intp)
+            self._list_arrays[cell] = array
+        return array
+
+    def _grow_assignments(self, size: int) -> None:
+        if size > self._assignments.shape[0]:
+            grown = np.full(
+                max(size, 2 * self._assignments.shape[0]), -1, dtype=np.intp
+            )
+            grown[: self._assignments.shape[0]] = self._assignments
+            self._assignments = grown
+
+    def _nearest_centroids(
+        self, vectors: np.ndarray, chunk_size: int = 8192
+    ) -> np.ndarray:
+        return np.concatenate(
+            [
+                np.argmax(
+                    vectors[start : start + chunk_size] @ self.centroids.T, axis=1
+                )
+                for start in range(0, vectors.shape[0], chunk_size)
+            ]
+        )
+
+    def _kmeans(self, vectors: np.ndarray, n_lists: int) -> np.ndarray:
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(vectors.shape[0], 256 * n_lists)
+        sample = vectors[rng.choice(vectors.shape[0], sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        self.centroids = centroids
+        for _ in range(self.n_iter):
+            cells = self._nearest_centroids(sample)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, cells, sample)
+            counts = np.bincount(cells, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids, _ = _normalize_rows(sums)
+            self.centroids = centroids.astype(np.float32)
+        return self.centroids
+
+
+def recall_report(
+    vector_db: "VectorDatabase",
+    query_vectors: Iterable[Iterable[float]],
+    k: int = 10,
+    nprobe_values: Sequence[int] = (1, 2, 4, 8, 16, 32),
+) -> List[Dict[str, float]]:
+    """Measure recall@k and latency of the IVF index against exact search.
+
+    Returns one row per ``nprobe`` setting with the mean recall and the mean
+    per-query latency in milliseconds. The index's ``nprobe`` is restored
+    afterwards.
+    """
+
+    index = vector_db.index
+    if not isinstance(index, IVFIndex) or not index.is_trained:
+        raise ValueError("vector_db must have a trained IVFIndex")
+
+    queries = [np.asarray(query, dtype=np.float32) for query in query_vectors]
+    exact = vector_db.search_batch(queries, k, exact=True)
+    exact_keys = [{key for key, _ in results} for results in exact]
+
+    report: List[Dict[str, float]] = []
+    original_nprobe = index.nprobe
+    try:
+        for nprobe in nprobe_values:
+            index.nprobe = nprobe
+            start = time.perf_counter()
+            approximate = vector_db.search_batch(queries, k)
+            elapsed = time.perf_counter() - start
+            recalls = [
+                len(expected & {key for key, _ in results}) / max(len(expected), 1)
+                for expected, results in zip(exact_keys, approximate)
+            ]
+            report.append(
+                {
+                    "nprobe": nprobe,
+                    "recall": float(np.mean(recalls)),
+                    "latency_ms": 1000 * elapsed / max(len(queries), 1),
+                }
+            )
+    finally:
+        index.nprobe = original_nprobe
+    return report
+
+
+def scan_dims_report(
+    vector_db: "VectorDatabase",
+    query_vectors: Iterable[Iterable[float]],
+    k: int = 10,
+    scan_dims_values: Sequence[int] = (64, 128, 256, 512),
+    rerank_factor: int = 4,
+    storage: str = "float32",
+) -> List[Dict[str, float]]:
+    """Measure two-stage (truncated scan + full re-rank) search.
+
+    Rebuilds the live vectors of a full-dimension ``vector_db`` once per
+    ``scan_dims`` value and reports recall@k against exact full-dimension
+    search, the mean per-query latency in milliseconds and the megabytes held
+    by the scanned matrix. The first row is the full-dimension baseline.
+    """
+
+    from aimakerspace.vectordatabase import VectorDatabase
+
+    queries = [np.asarray(query, dtype=np.float32) for query in query_vectors]
+
+    def measure(candidate: "VectorDatabase") -> Tuple[list, float]:
+        start = time.perf_counter()
+        results = candidate.search_batch(queries, k, exact=True)
+        elapsed = time.perf_counter() - start
+        return results, 1000 * elapsed / max(len(queries), 1)
+
+    exact, baseline_ms = measure(vector_db)
+    exact_keys = [{key for key, _ in results} for results in exact]
+    report: List[Dict[str, float]] = [
+        {
+            "scan_dims": vector_db.dim,
+            "recall": 1.0,
+            "latency_ms": baseline_ms,
+            "scan_mb": vector_db.scan_nbytes / 2**20,
+        }
+    ]
+    for scan_dims in scan_dims_values:
+        if scan_dims >= vector_db.dim:
+            continue
+        candidate = VectorDatabase(
+            initial_capacity=max(1, len(vector_db)),
+            storage=storage,
+            rerank_factor=rerank_factor,
+            scan_dims=scan_dims,
+        )
+        for ids, vectors, texts, _ in vector_db.iter_records():
+            candidate.upsert(ids, vectors, texts)
+        approximate, latency_ms = measure(candidate)
+        recalls = [
+            len(expected & {key for key, _ in results}) / max(len(expected), 1)
+            for expected, results in zip(exact_keys, approximate)
+        ]
+        report.append(
+            {
+                "scan_dims": scan_dims,
+                "recall": float(np.mean(recalls)),
+                "latency_ms": latency_ms,
+                "scan_mb": candidate.scan_nbytes / 2**20,
+            }
+        )
+    return report
@@ -0,0 +1,306 @@
+import asyncio
+import re
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from aimakerspace.vectordatabase import VectorDatabase, _top_k_indices
+
+# Keeps codes such as "xj-9000" or "v2.1" together as single tokens.
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-.]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case ``text`` and split it into BM25 terms."""
+
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted-index BM25 ranking over short text chunks.
+
+    Postings are appended to per-term arrays as documents arrive and are
+    packed into CSR-style numpy arrays (term offsets, document numbers and
+    precomputed BM25 weights) on the next search, so a query is a handful of
+    slices and one ``np.bincount``.
+
+    Removed documents are dropped from the packed postings and from the
+    corpus statistics (document count, document frequencies and average
+    length) straight away; their raw postings are reclaimed by
+    :meth:`compact`, which runs once more than ``compaction_threshold`` of
+    the documents are dead.
+    """
+
+    def __init__(
+        self, k1: float = 1.5, b: float = 0.75, compaction_threshold: float = 0.25
+    ):
+        self.k1 = k1
+        self.b = b
+        self.compaction_threshold = compaction_threshold
+        self._vocabulary: Dict[str, int] = {}
+        self._term_docs: List[array] = []
+        self._term_freqs: List[array] = []
+        self._doc_lengths = array("i")
+        self._doc_ids = array("q")
+        self._alive = array("b")
+        self._id_to_doc: Dict[int, int] = {}
+        self._packed: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self._id_to_doc)
+
+    def add(
+        self, texts: Iterable[str], ids: Optional[Sequence[int]] = None
+    ) -> List[int]:
+        """Index ``texts`` under ``ids`` (defaults to consecutive numbers)."""
+
+        texts = list(texts)
+        if ids is None:
+            start = max(self._id_to_doc, default=-1) + 1
+            ids = range(start, start + len(texts))
+        if len(ids) != len(texts):
+            raise ValueError("texts and ids must have the same length")
+
+        self.remove(record_id for record_id in ids if record_id in self._id_to_doc)
+        for record_id, text in zip(ids, texts):
+            doc = len(self._doc_ids)
+            tokens = tokenize(text)
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                term = self._vocabulary.get(token)
+                if term is None:
+                    term = self._vocabulary[token] = len(self._term_docs)
+                    self._term_docs.append(array("i"))
+                    self._term_freqs.append(array("i"))
+                self._term_docs[term].append(doc)
+                self._term_freqs[term].append(count)
+            self._doc_lengths.append(len(tokens))
+            self._doc_ids.append(int(record_id))
+            self._alive.append(1)
+            self._id_to_doc[int(record_id)] = doc
+        self._packed = None
+        return [int(record_id) for record_id in ids]
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Exclude ``ids`` from future results."""
+
+        for record_id in list(ids):
+            doc = self._id_to_doc.pop(int(record_id), None)
+            if doc is not None:
+                self._alive[doc] = 0
+                self._packed = None
+        dead = len(self._doc_ids) - len(self._id_to_doc)
+        if dead > self.compaction_threshold * len(self._doc_ids):
+            self.compact()
+
+    def compact(self) -> None:
+        """Drop the postings of removed documents and renumber the rest."""
+
+        alive = np.frombuffer(self._alive, dtype=np.int8).astype(bool)
+        if alive.all():
+            return
+
+        new_doc = (np.cumsum(alive) - 1).astype(np.int32)
+        vocabulary: Dict[str, int] = {}
+        term_docs: List[array] = []
+        term_freqs: List[array] = []
+        for token, term in self._vocabulary.items():
+            docs = np.frombuffer(self._term_docs[term], dtype=np.int32)
+            keep = alive[docs]
+            if not keep.any():
+                continue
+            vocabulary[token] = len(term_docs)
+            term_docs.append(array("i", new_doc[docs[keep]].tobytes()))
+            freqs = np.frombuffer(self._term_freqs[term], dtype=np.int32)
+            term_freqs.append(array("i", freqs[keep].tobytes()))
+
+        self._vocabulary = vocabulary
+        self._term_docs = term_docs
+        self._term_freqs = term_freqs
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.int32)[alive]
+        self._doc_lengths = array("i", lengths.tobytes())
+        doc_ids = np.frombuffer(self._doc_ids, dtype=np.int64)[alive]
+        self._doc_ids = array("q", doc_ids.tobytes())
+        self._alive = array("b", bytes([1]) * len(self._doc_ids))
+        self._id_to_doc = {
+            int(record_id): doc for doc, record_id in enumerate(self._doc_ids)
+        }
+        self._packed = None
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to ``k`` ``(id, score)`` pairs with a positive BM25 score."""
+
+        if k <= 0:
+            raise ValueError("k must be a positive integer")
+
+        terms = {self._vocabulary.get(token) for token in tokenize(query)}
+        terms.discard(None)
+        if not terms or not self._id_to_doc:
+            return []
+
+        offsets, docs, weights = self._pack()
+        slices = [slice(offsets[term], offsets[term + 1]) for term in terms]
+        scores = np.bincount(
+            np.concatenate([docs[part] for part in slices]),
+            weights=np.concatenate([weights[part] for part in slices]),
+            minlength=len(self._doc_ids),
+        )
+        ranked = _top_k_indices(scores, min(k, scores.shape[0]))
+        return [
+            (self._doc_ids[doc], float(scores[doc]))
+            for doc in ranked
+            if scores[doc] > 0
+        ]
+
+    def _pack(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._packed is not None:
+            return self._packed
+
+        raw_lengths = [len(docs) for docs in self._term_docs]
+        docs = np.concatenate(
+            [np.frombuffer(term_docs, dtype=np.int32) for term_docs in self._term_docs]
+        )
+        freqs = np.concatenate(
+            [
+                np.frombuffer(term_freqs, dtype=np.int32)
+                for term_freqs in self._term_freqs
+            ]
+        ).astype(np.float32)
+
+        # Leave removed documents out of the postings and every statistic.
+        alive = np.frombuffer(self._alive, dtype=np.int8).astype(bool)
+        terms = np.repeat(np.arange(len(raw_lengths)), raw_lengths)
+        keep = alive[docs]
+        docs, freqs = docs[keep], freqs[keep]
+        lengths = np.bincount(terms[keep], minlength=len(raw_lengths))
+        offsets = np.zeros(lengths.shape[0] + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.int32)
+        n_docs = len(self._id_to_doc)
+        average_length = max(float(doc_lengths[alive].mean()) if n_docs else 1.0, 1.0)
+        idf = np.log1p((n_docs - lengths + 0.5) / (lengths + 0.5)).astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * doc_lengths[docs] / average_length)
+        weights = np.repeat(idf, lengths) * freqs * (self.k1 + 1) / (freqs + norm)
+
+        self._packed = (offsets, docs, weights.astype(np.float32))
+        return self._packed
+
+
+class HybridRetriever:
+    """Fuse BM25 and dense results over the same chunks.
+
+    Records are shared by id: :meth:`abuild_from_list` adds each chunk to the
+    :class:`VectorDatabase` and indexes the returned ids in a
+    :class:`BM25Index`. ``fusion`` is ``"rrf"`` (reciprocal-rank fusion with
+    constant ``rrf_k``) or ``"weighted"`` (min-max normalized scores mixed
+    with weight ``alpha`` on the dense side).
+    """
+
+    def __init__(
+        self,
+        vector_db: VectorDatabase,
+        lexical_index: Optional[BM25Index] = None,
+        fusion: str = "rrf",
+        rrf_k: int = 60,
+        alpha: float = 0.5,
+    ):
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError("fusion must be 'rrf' or 'weighted'")
+
+        self.vector_db = vector_db
+        self.lexical_index = lexical_index or BM25Index()
+        self.fusion = fusion
+        self.rrf_k = rrf_k
+        self.alpha = alpha
+
+    async def abuild_from_list(self, list_of_text: List[str]) -> "HybridRetriever":
+        """Embed and index ``list_of_text`` on both the dense and lexical side."""
+
+        embeddings = await self.vector_db.embedding_model.async_get_embeddings(
+            list_of_text
+        )
+        ids = self.vector_db.add(embeddings, texts=list_of_text)
+        self.lexical_index.add(list_of_text, ids)
+        return self
+
+    def lexical_search(self, query_text: str, k: int) -> List[Tuple[str, float]]:
+        """BM25-only search; needs no embedding call."""
+
+        return self._as_text(self.lexical_index.search(query_text, k))
+
+    def hybrid_search(
+        self, query_text: str, k: int, candidates: Optional[int] = None
+    ) -> List[Tuple[str, float]]:
+        """Fuse the top ``candidates`` (default ``4 * k``) of each retriever."""
+
+        query_vector = self.vector_db.embedding_model.get_embedding(query_text)
+        return self._fuse(query_text, query_vector, k, candidates)
+
+    async def ahybrid_search(
+        self,
+        query_text: str,
+        k: int,
+        candidates: Optional[int] = None,
+        embedding_timeout: Optional[float] = None,
+    ) -> List[Tuple[str, float]]:
+        """Async :meth:`hybrid_search` that degrades to BM25 when embedding is slow.
+
+        If the query embedding does not arrive within ``embedding_timeout``
+        seconds the lexical results are returned on their own.
+        """
+
+        try:
+            query_vector = await asyncio.wait_for(
+                self.vector_db.embedding_model.async_get_embedding(query_text),
+                embedding_timeout,
+            )
+        except asyncio.TimeoutError:
+            return self.lexical_search(query_text, k)
+        return self._fuse(query_text, query_vector, k, candidates)
+
+    def _fuse(
+        self,
+        query_text: str,
+        query_vector: Sequence[float],
+        k: int,
+        candidates: Optional[int],
+    ) -> List[Tuple[str, float]]:
+        depth = candidates or 4 * k
+        dense = self.vector_db.search_ids(query_vector, depth)
+        lexical = self.lexical_index.search(query_text, depth)
+
+        fused: Dict[int, float] = {}
+        if self.fusion == "rrf":
+            for results in (dense, lexical):
+                for rank, (record_id, _) in enumerate(results):
+                    fused[record_id] = fused.get(record_id, 0.0) + 1.0 / (
+                        self.rrf_k + rank + 1
+                    )
+        else:
+            for weight, results in ((self.alpha, dense), (1 - self.alpha, lexical)):
+                for record_id, score in _min_max(results):
+                    fused[record_id] = fused.get(record_id, 0.0) + weight * score
+
+        best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+        return self._as_text(best)
+
+    def _as_text(self, results: List[Tuple[int, float]]) -> List[Tuple[str, float]]:
+        return [
+            (self.vector_db.get_text(record_id), score) for record_id, score in results
+        ]
+
+
+def _min_max(results: List[Tuple[int, float]]) -> List[Tuple[int, float]]:
+    if not results:
+        return []
+    scores = [score for _, score in results]
+    low, high = min(scores), max(scores)
+    span = high - low
+    return [
+        (record_id, 1.0 if span == 0 else (score - low) / span)
+        for record_id, score in results
+    ]
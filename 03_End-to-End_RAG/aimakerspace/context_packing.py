@@ -0,0 +1,240 @@
+import importlib.util
+import re
+from functools import lru_cache
+from typing import Any, FrozenSet, List, Optional, Sequence, Tuple
+
+# Without tiktoken, words are counted in pieces of up to six characters and
+# every punctuation mark on its own, which slightly over-counts English text.
+_APPROX_TOKEN_PATTERN = re.compile(r"\w{1,6}|[^\w\s]")
+_WORD_PATTERN = re.compile(r"\w+")
+_SHINGLE_SIZE = 4
+
+
+def tiktoken_available() -> bool:
+    """Exact counts need the optional ``tiktoken`` package."""
+
+    return importlib.util.find_spec("tiktoken") is not None
+
+
+class TokenCounter:
+    """Local token counter for budgeting prompt text.
+
+    Uses the ``tiktoken`` encoding of ``model`` when the package is
+    installed and a conservative regex estimate otherwise. Counts are
+    memoised, since the same chunks come back across queries.
+    """
+
+    def __init__(self, model: str = "gpt-4o-mini", cache_size: int = 8192):
+        self.model = model
+        self._encoding = _load_encoding(model) if tiktoken_available() else None
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from the model's tokenizer."""
+
+        return self._encoding is not None
+
+    def _count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode_ordinary(text))
+        return len(_APPROX_TOKEN_PATTERN.findall(text))
+
+
+def _load_encoding(model: str) -> Any:
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+class PackedContext:
+    """Outcome of :meth:`ContextPacker.pack`: chosen passages and their cost."""
+
+    __slots__ = ("contexts", "tokens", "dropped")
+
+    def __init__(self, contexts: List[Tuple[str, float]], tokens: int, dropped: int):
+        self.contexts = contexts
+        self.tokens = tokens
+        self.dropped = dropped
+
+
+class _Passage:
+    __slots__ = ("text", "score", "tokens", "shingles")
+
+    def __init__(self, text: str, score: float, tokens: int, shingles: FrozenSet):
+        self.text = text
+        self.score = score
+        self.tokens = tokens
+        self.shingles = shingles
+
+
+class ContextPacker:
+    """Select retrieved chunks to fit a prompt token budget.
+
+    Candidates are taken in maximal-marginal-relevance order: a chunk's
+    score minus how much of it (by word 4-gram containment) is already in
+    the context, weighted by ``diversity``. Chunks that are at least
+    ``duplicate_threshold`` contained are dropped. A chunk whose start or
+    end overlaps a chosen passage by ``min_overlap`` characters or more, as
+    neighbouring :class:`CharacterTextSplitter` chunks do, is merged into
+    that passage and only its new text is paid for. Chunks that no longer
+    fit the remaining budget are skipped in favour of smaller ones further
+    down the list. ``chunk_overhead`` tokens are reserved per passage for
+    the source labels added by the prompt.
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        counter: Optional[TokenCounter] = None,
+        diversity: float = 0.3,
+        duplicate_threshold: float = 0.8,
+        min_overlap: int = 32,
+        chunk_overhead: int = 6,
+    ):
+        if token_budget <= 0:
+            raise ValueError("token_budget must be a positive integer")
+        if not 0.0 <= diversity <= 1.0:
+            raise ValueError("diversity must be between 0 and 1")
+        if min_overlap <= 0:
+            raise ValueError("min_overlap must be a positive integer")
+
+        self.token_budget = token_budget
+        self.counter = counter or TokenCounter()
+        self.diversity = diversity
+        self.duplicate_threshold = duplicate_threshold
+        self.min_overlap = min_overlap
+        self.chunk_overhead = chunk_overhead
+
+    def pack(
+        self,
+        results: Sequence[Tuple[str, float]],
+        token_budget: Optional[int] = None,
+    ) -> PackedContext:
+        """Pack ``(text, score)`` search results, best first, into the budget."""
+
+        remaining = self.token_budget if token_budget is None else token_budget
+        candidates = [(text, float(score), _shingles(text)) for text, score in results]
+        redundancy = [0.0] * len(candidates)
+        passages: List[_Passage] = []
+        used = 0
+
+        while candidates:
+            best = max(
+                range(len(candidates)),
+                key=lambda i: (1.0 - self.diversity) * candidates[i][1]
+                - self.diversity * redundancy[i],
+            )
+            text, score, shingles = candidates.pop(best)
+            if redundancy.pop(best) >= self.duplicate_threshold:
+                continue
+
+            passage, new_text, prepend = self._merge_target(passages, text)
+            if passage is None:
+                cost = self.counter.count(text) + self.chunk_overhead
+            else:
+                cost = self.counter.count(new_text)
+            if cost > remaining:
+                continue
+
+            remaining -= cost
+            used += 1
+            if passage is None:
+                passage = _Passage(text, score, cost - self.chunk_overhead, shingles)
+                passages.append(passage)
+            else:
+                passage.text = (
+                    new_text + passage.text if prepend else passage.text + new_text
+                )
+                passage.score = max(passage.score, score)
+                passage.tokens += cost
+                passage.shingles = passage.shingles | shingles
+                passage, freed = self._join_neighbours(passages, passage)
+                remaining += freed
+
+            for index, (_, _, other) in enumerate(candidates):
+                redundancy[index] = max(
+                    redundancy[index], _containment(other, passage.shingles)
+                )
+
+        passages.sort(key=lambda p: p.score, reverse=True)
+        tokens = sum(p.tokens for p in passages) + self.chunk_overhead * len(passages)
+        return PackedContext(
+            [(p.text, p.score) for p in passages], tokens, len(results) - used
+        )
+
+    def _join_neighbours(
+        self, passages: List[_Passage], passage: _Passage
+    ) -> Tuple[_Passage, int]:
+        """Fold ``passage`` into any passage it now bridges to.
+
+        Returns the surviving passage and the tokens freed by the merge.
+        """
+
+        freed = 0
+        while True:
+            others = [other for other in passages if other is not passage]
+            target, new_text, prepend = self._merge_target(others, passage.text)
+            if target is None:
+                return passage, freed
+            cost = self.counter.count(new_text)
+            freed += passage.tokens + self.chunk_overhead - cost
+            target.text = new_text + target.text if prepend else target.text + new_text
+            target.score = max(target.score, passage.score)
+            target.tokens += cost
+            target.shingles = target.shingles | passage.shingles
+            passages.remove(passage)
+            passage = target
+
+    def _merge_target(
+        self, passages: List[_Passage], text: str
+    ) -> Tuple[Optional[_Passage], str, bool]:
+        """Find a passage ``text`` continues; return it, the new text and side."""
+
+        for passage in passages:
+            if text in passage.text:
+                return passage, "", False
+            overlap = _edge_overlap(passage.text, text, self.min_overlap)
+            if overlap:
+                return passage, text[overlap:], False
+            overlap = _edge_overlap(text, passage.text, self.min_overlap)
+            if overlap:
+                return passage, text[: len(text) - overlap], True
+        return None, text, False
+
+
+def _shingles(text: str) -> FrozenSet[int]:
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < _SHINGLE_SIZE:
+        return frozenset([hash(tuple(words))])
+    return frozenset(
+        hash(shingle) for shingle in zip(*(words[i:] for i in range(_SHINGLE_SIZE)))
+    )
+
+
+def _containment(shingles: FrozenSet[int], context: FrozenSet[int]) -> float:
+    """Fraction of ``shingles`` already present in ``context``."""
+
+    if not shingles:
+        return 0.0
+    return len(shingles & context) / len(shingles)
+
+
+def _edge_overlap(left: str, right: str, min_overlap: int) -> int:
+    """Length of the longest suffix of ``left`` that starts ``right``, or 0.
+
+    Overlaps shorter than ``min_overlap`` characters do not count.
+    """
+
+    if min(len(left), len(right)) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    position = left.find(probe, max(0, len(left) - len(right)))
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
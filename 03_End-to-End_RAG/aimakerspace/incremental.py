@@ -0,0 +1,181 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from aimakerspace.text_utils import TextFileLoader, TextSplitter
+from aimakerspace.vectordatabase import VectorDatabase, _save_json
+
+_MANIFEST_VERSION = 2
+
+
+class FileRecord:
+    """What the manifest remembers about one indexed file."""
+
+    __slots__ = ("mtime", "size", "sha256", "chunk_ids")
+
+    def __init__(self, mtime: float, size: int, sha256: str, chunk_ids: List[int]):
+        self.mtime = mtime
+        self.size = size
+        self.sha256 = sha256
+        self.chunk_ids = chunk_ids
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "mtime": self.mtime,
+            "size": self.size,
+            "sha256": self.sha256,
+            "chunk_ids": self.chunk_ids,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> "FileRecord":
+        return cls(data["mtime"], data["size"], data["sha256"], list(data["chunk_ids"]))
+
+
+class IncrementalIndexer:
+    """Keep a :class:`VectorDatabase` in sync with the files under a loader.
+
+    A manifest maps each file to its ``(mtime, size, sha256)`` and the ids of
+    the chunks it contributed. :meth:`arefresh` only reads files whose size
+    or mtime changed, only re-splits and re-embeds files whose content hash
+    changed, and deletes the records of files that disappeared. Chunks are
+    stored with a ``source`` metadata field holding the file path.
+
+    Changed files are split with ``split_chunks`` into offsets, and chunk
+    strings and embeddings are materialised ``batch_size`` chunks at a time.
+
+    The manifest only describes ``vector_db``: files whose chunks are missing
+    from it (say, a fresh store after a restart) are forgotten on load and
+    indexed again by the next refresh. Persist the store with
+    :meth:`VectorDatabase.save` alongside the manifest to avoid re-embedding.
+    """
+
+    def __init__(
+        self,
+        loader: TextFileLoader,
+        splitter: TextSplitter,
+        vector_db: VectorDatabase,
+        manifest_path: Optional[Union[str, Path]] = None,
+        batch_size: int = 512,
+    ):
+        if batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer")
+
+        self.loader = loader
+        self.splitter = splitter
+        self.vector_db = vector_db
+        self.manifest_path = Path(manifest_path) if manifest_path else None
+        self.batch_size = batch_size
+        self.records: Dict[str, FileRecord] = {}
+        if self.manifest_path is not None and self.manifest_path.exists():
+            self.records = self._read_manifest(self.manifest_path)
+            self._drop_missing()
+
+    async def arefresh(self) -> Dict[str, int]:
+        """Bring the vector store up to date and return per-status file counts."""
+
+        stats = {"added": 0, "modified": 0, "deleted": 0, "unchanged": 0}
+        seen: set = set()
+        stale_ids: List[int] = []
+        changed: Dict[str, str] = {}
+        # New records are only committed once their chunks are stored, so a
+        # failed embedding call leaves the manifest and the store untouched.
+        updated: Dict[str, FileRecord] = {}
+
+        for path in self.loader.iter_paths():
+            name = str(path)
+            seen.add(name)
+            stat = path.stat()
+            record = self.records.get(name)
+            if record and (record.mtime, record.size) == (stat.st_mtime, stat.st_size):
+                stats["unchanged"] += 1
+                continue
+
+            raw = path.read_bytes()
+            digest = hashlib.sha256(raw).hexdigest()
+            if record and record.sha256 == digest:
+                record.mtime, record.size = stat.st_mtime, stat.st_size
+                stats["unchanged"] += 1
+                continue
+
+            if record:
+                stale_ids.extend(record.chunk_ids)
+                stats["modified"] += 1
+            else:
+                stats["added"] += 1
+            changed[name] = raw.decode(self.loader.encoding)
+            updated[name] = FileRecord(stat.st_mtime, stat.st_size, digest, [])
+
+        removed = [name for name in self.records if name not in seen]
+        for name in removed:
+            stale_ids.extend(self.records[name].chunk_ids)
+            stats["deleted"] += 1
+
+        names = list(changed)
+        chunks = self.splitter.split_chunks(changed.values())
+        added: List[int] = []
+        try:
+            for number, batch in enumerate(chunks.iter_batches(self.batch_size)):
+                start = number * self.batch_size
+                sources = [
+                    names[chunk.doc_id] for chunk in chunks[start : start + len(batch)]
+                ]
+                embeddings = await self.vector_db.embedding_model.async_get_embeddings(
+                    batch
+                )
+                ids = self.vector_db.add(
+                    embeddings,
+                    texts=batch,
+                    metadata=[{"source": name} for name in sources],
+                )
+                added.extend(ids)
+                for record_id, name in zip(ids, sources):
+                    updated[name].chunk_ids.append(record_id)
+        except BaseException:
+            # Keep the store consistent with the untouched manifest.
+            self.vector_db.delete(added)
+            raise
+
+        self.vector_db.delete(stale_ids)
+        for name in removed:
+            del self.records[name]
+        self.records.update(updated)
+
+        if self.manifest_path is not None:
+            self.save_manifest(self.manifest_path)
+        return stats
+
+    def save_manifest(self, path: Union[str, Path]) -> None:
+        """Atomically write the manifest as JSON to ``path``."""
+
+        _save_json(
+            Path(path),
+            {
+                "format_version": _MANIFEST_VERSION,
+                "files": {
+                    name: record.to_dict() for name, record in self.records.items()
+                },
+            },
+        )
+
+    def _drop_missing(self) -> None:
+        # A record is only trusted if every chunk it lists is still stored;
+        # whatever is left of a partially stored file is deleted so the
+        # re-index does not duplicate it.
+        for name, record in list(self.records.items()):
+            if any(self.vector_db.get_metadata(i) is None for i in record.chunk_ids):
+                self.vector_db.delete(record.chunk_ids)
+                del self.records[name]
+
+    @staticmethod
+    def _read_manifest(path: Path) -> Dict[str, FileRecord]:
+        with path.open("r", encoding="utf-8") as file_handle:
+            manifest = json.load(file_handle)
+        if manifest.get("format_version") != _MANIFEST_VERSION:
+            raise ValueError(
+                f"Unsupported manifest format: {manifest.get('format_version')}"
+            )
+        return {
+            name: FileRecord.from_dict(data) for name, data in manifest["files"].items()
+        }
@@ -0,0 +1,110 @@
+import asyncio
+from collections import deque
+from pathlib import Path
+from typing import AsyncIterator, Deque, Iterator, List, Protocol, Tuple
+
+from aimakerspace.text_utils import ChunkList, TextSplitter
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+class DocumentLoader(Protocol):
+    def iter_paths(self) -> Iterator[Path]: ...
+
+    def iter_documents(self) -> Iterator[str]: ...
+
+
+async def aiter_documents(loader: DocumentLoader) -> AsyncIterator[Tuple[str, str]]:
+    """Yield ``(source, document)`` pairs, reading each one in a worker thread.
+
+    File I/O and PDF parsing therefore run while the event loop is busy
+    awaiting embedding requests for earlier documents.
+    """
+
+    documents = zip(loader.iter_paths(), loader.iter_documents())
+    sentinel = object()
+    while True:
+        item = await asyncio.to_thread(next, documents, sentinel)
+        if item is sentinel:
+            return
+        path, document = item
+        yield str(path), document
+
+
+async def aiter_chunk_batches(
+    loader: DocumentLoader,
+    splitter: TextSplitter,
+    batch_size: int = 512,
+) -> AsyncIterator[Tuple[List[str], List[str]]]:
+    """Yield ``(chunks, sources)`` batches of at most ``batch_size`` chunks.
+
+    Each document is split in a worker thread. Pending chunks are held as
+    offsets into their documents in a :class:`ChunkList`; chunk strings are
+    only sliced out when their batch is yielded.
+    """
+
+    if batch_size <= 0:
+        raise ValueError("batch_size must be a positive integer")
+
+    chunks = ChunkList()
+    sources: List[str] = []
+
+    def batch() -> Tuple[List[str], List[str]]:
+        return chunks.texts(), [sources[chunk.doc_id] for chunk in chunks]
+
+    async for source, document in aiter_documents(loader):
+        doc_id = chunks.add_document(document)
+        sources.append(source)
+        spans = await asyncio.to_thread(list, splitter.iter_spans(document))
+        for start, end in spans:
+            chunks.append(doc_id, start, end)
+            if len(chunks) == batch_size:
+                yield batch()
+                # Only the current document can still contribute chunks.
+                chunks, sources = ChunkList([document]), [source]
+                doc_id = 0
+    if len(chunks):
+        yield batch()
+
+
+async def aingest(
+    loader: DocumentLoader,
+    splitter: TextSplitter,
+    vector_db: VectorDatabase,
+    batch_size: int = 512,
+    max_in_flight: int = 4,
+) -> VectorDatabase:
+    """Stream documents through ``splitter`` and embed them into ``vector_db``.
+
+    Up to ``max_in_flight`` chunk batches are being embedded at any time;
+    each is inserted as soon as its turn comes, so reading, embedding and
+    indexing overlap and memory stays bounded by the batch window rather
+    than by the size of the corpus. Every chunk becomes its own record with
+    a ``source`` metadata field holding its file path.
+    """
+
+    if max_in_flight <= 0:
+        raise ValueError("max_in_flight must be a positive integer")
+
+    embedding_model = vector_db.embedding_model
+    pending: Deque[Tuple[List[str], List[str], asyncio.Task]] = deque()
+
+    async def insert_oldest() -> None:
+        chunks, sources, task = pending.popleft()
+        vector_db.add(
+            await task,
+            texts=chunks,
+            metadata=[{"source": source} for source in sources],
+        )
+
+    try:
+        async for batch, sources in aiter_chunk_batches(loader, splitter, batch_size):
+            if len(pending) >= max_in_flight:
+                await insert_oldest()
+            task = asyncio.ensure_future(embedding_model.async_get_embeddings(batch))
+            pending.append((batch, sources, task))
+        while pending:
+            await insert_oldest()
+    finally:
+        for _, _, task in pending:
+            task.cancel()
+    return vector_db
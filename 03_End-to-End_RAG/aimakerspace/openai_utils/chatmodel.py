@@ -1,19 +1,76 @@
+import asyncio
+import hashlib
+import json
 import os
-from typing import Any, AsyncIterator, Iterable, List, MutableMapping
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from dotenv import load_dotenv
 from openai import AsyncOpenAI, OpenAI
 
+from aimakerspace.openai_utils.rate_limit import call_with_retries
+
+if TYPE_CHECKING:
+    from aimakerspace.semantic_cache import SemanticCache
+
 load_dotenv()
 
 ChatMessage = MutableMapping[str, Any]
 
 
+_USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+class BatchResult:
+    """Outcome of :meth:`ChatOpenAI.abatch`: results in input order plus usage."""
+
+    __slots__ = ("results", "usage")
+
+    def __init__(self, results: List[Any], usage: Dict[str, int]):
+        self.results = results
+        self.usage = usage
+
+    @property
+    def failures(self) -> List[int]:
+        """Indexes whose result is an exception (with ``return_exceptions``)."""
+
+        return [
+            index
+            for index, result in enumerate(self.results)
+            if isinstance(result, BaseException)
+        ]
+
+
 class ChatOpenAI:
-    """Thin wrapper around the OpenAI chat completion APIs."""
+    """Thin wrapper around the OpenAI chat completion APIs.
+
+    With a ``semantic_cache``, text completions are looked up by the last user
+    message (or an explicit ``cache_query``) before calling the API, and fresh
+    answers are stored back. Cached answers are scoped to the model, the
+    request options and a digest of every other message (system prompt and
+    earlier turns), so different temperatures, system prompts or
+    conversations never share entries. The question is embedded once per
+    request and reused for both the lookup and the store.
+    """
 
-    def __init__(self, model_name: str = "gpt-4o-mini"):
+    def __init__(
+        self,
+        model_name: str = "gpt-4o-mini",
+        semantic_cache: Optional["SemanticCache"] = None,
+    ):
         self.model_name = model_name
+        self.semantic_cache = semantic_cache
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         if self.openai_api_key is None:
             raise ValueError("OPENAI_API_KEY is not set")
@@ -25,6 +82,7 @@ class ChatOpenAI:
         self,
         messages: Iterable[ChatMessage],
         text_only: bool = True,
+        cache_query: Optional[str] = None,
         **kwargs: Any,
     ) -> Any:
         """Execute a chat completion request.
@@ -32,34 +90,212 @@ class ChatOpenAI:
         ``messages`` must be an iterable of ``{"role": ..., "content": ...}``
         dictionaries. When ``text_only`` is ``True`` (the default) only the
         completion text is returned; otherwise the full response object is
-        provided.
+        provided. ``cache_query`` replaces the last user message as the
+        semantic-cache key, e.g. the bare question of a RAG prompt.
         """
 
         message_list = self._coerce_messages(messages)
+        question = self._cache_question(message_list, text_only, cache_query)
+        if question is not None:
+            scope = self._cache_scope(message_list, kwargs)
+            embedding = self.semantic_cache.embed(question)
+            cached = self.semantic_cache.lookup(question, scope, embedding)
+            if cached is not None:
+                return cached
+
         response = self._client.chat.completions.create(
             model=self.model_name, messages=message_list, **kwargs
         )
 
         if text_only:
-            return response.choices[0].message.content
+            content = response.choices[0].message.content
+            if question is not None and content is not None:
+                self.semantic_cache.store(question, content, scope, embedding=embedding)
+            return content
 
         return response
 
     async def astream(
-        self, messages: Iterable[ChatMessage], **kwargs: Any
+        self,
+        messages: Iterable[ChatMessage],
+        cache_query: Optional[str] = None,
+        **kwargs: Any,
     ) -> AsyncIterator[str]:
-        """Yield streaming completion chunks as they arrive from the API."""
+        """Yield streaming completion chunks as they arrive from the API.
+
+        A semantic-cache hit is yielded as a single chunk; a completed stream
+        is stored in the cache.
+        """
 
         message_list = self._coerce_messages(messages)
+        question = self._cache_question(message_list, True, cache_query)
+        if question is not None:
+            scope = self._cache_scope(message_list, kwargs)
+            embedding = await self.semantic_cache.aembed(question)
+            cached = await self.semantic_cache.alookup(question, scope, embedding)
+            if cached is not None:
+                yield cached
+                return
+
         stream = await self._async_client.chat.completions.create(
             model=self.model_name, messages=message_list, stream=True, **kwargs
         )
 
+        parts: List[str] = []
         async for chunk in stream:
             content = chunk.choices[0].delta.content
             if content is not None:
+                parts.append(content)
                 yield content
 
+        if question is not None:
+            await self.semantic_cache.astore(
+                question, "".join(parts), scope, embedding=embedding
+            )
+
+    async def abatch(
+        self,
+        message_lists: Sequence[Iterable[ChatMessage]],
+        max_concurrency: int = 8,
+        text_only: bool = True,
+        max_retries: int = 6,
+        return_exceptions: bool = False,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        **kwargs: Any,
+    ) -> BatchResult:
+        """Run many completions concurrently and return them in input order.
+
+        At most ``max_concurrency`` requests are in flight; each one is
+        retried on its own with the shared backoff that honours
+        ``Retry-After``. ``on_progress(done, total)`` is called as requests
+        finish, and the summed token usage is reported on the result. With
+        ``return_exceptions`` a request that still fails is recorded in place
+        instead of aborting the batch.
+        """
+
+        results: List[Any] = [None] * len(message_lists)
+        usage = dict.fromkeys(_USAGE_FIELDS, 0)
+        done = 0
+        async for index, result in self.aiter_batch(
+            message_lists,
+            max_concurrency=max_concurrency,
+            text_only=text_only,
+            max_retries=max_retries,
+            return_exceptions=return_exceptions,
+            usage=usage,
+            **kwargs,
+        ):
+            results[index] = result
+            done += 1
+            if on_progress is not None:
+                on_progress(done, len(message_lists))
+        return BatchResult(results, usage)
+
+    async def aiter_batch(
+        self,
+        message_lists: Sequence[Iterable[ChatMessage]],
+        max_concurrency: int = 8,
+        text_only: bool = True,
+        max_retries: int = 6,
+        return_exceptions: bool = False,
+        usage: Optional[Dict[str, int]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """Yield ``(index, result)`` pairs of a batch as each request finishes.
+
+        Token usage is added into ``usage`` when a dict is given. Requests
+        still pending when the iterator is closed early are cancelled.
+        """
+
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be a positive integer")
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # Retries are handled per request by call_with_retries.
+        client = self._async_client.with_options(max_retries=0)
+
+        async def complete(index: int, message_list: List[ChatMessage]):
+            async with semaphore:
+                try:
+                    return index, await call_with_retries(
+                        lambda: client.chat.completions.create(
+                            model=self.model_name, messages=message_list, **kwargs
+                        ),
+                        max_retries=max_retries,
+                    )
+                except Exception as error:
+                    if not return_exceptions:
+                        raise
+                    return index, error
+
+        tasks = [
+            asyncio.ensure_future(complete(index, self._coerce_messages(messages)))
+            for index, messages in enumerate(message_lists)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, response = await next_done
+                if isinstance(response, Exception):
+                    yield index, response
+                    continue
+                if usage is not None and response.usage is not None:
+                    for field in _USAGE_FIELDS:
+                        usage[field] += getattr(response.usage, field, 0) or 0
+                yield index, (
+                    response.choices[0].message.content if text_only else response
+                )
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _cache_question(
+        self,
+        messages: List[ChatMessage],
+        text_only: bool,
+        cache_query: Optional[str],
+    ) -> Optional[str]:
+        """Return the semantic-cache key for a request, or ``None`` to bypass."""
+
+        if self.semantic_cache is None or not text_only:
+            return None
+        if cache_query is not None:
+            return cache_query
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                content = message.get("content")
+                return content if isinstance(content, str) else None
+        return None
+
+    def _cache_scope(self, messages: List[ChatMessage], options: Dict[str, Any]) -> str:
+        """Key everything but the question: model, options and other messages."""
+
+        last_user = next(
+            (
+                index
+                for index in range(len(messages) - 1, -1, -1)
+                if messages[index].get("role") == "user"
+            ),
+            None,
+        )
+        history = json.dumps(
+            [
+                dict(message)
+                for index, message in enumerate(messages)
+                if index != last_user
+            ],
+            sort_keys=True,
+            default=repr,
+        )
+        return json.dumps(
+            {
+                "model": self.model_name,
+                "messages": hashlib.sha256(history.encode("utf-8")).hexdigest(),
+                **options,
+            },
+            sort_keys=True,
+            default=repr,
+        )
+
     def _coerce_messages(self, messages: Iterable[ChatMessage]) -> List[ChatMessage]:
         if isinstance(messages, list):
             return messages
@@ -1,15 +1,49 @@
 import asyncio
 import os
-from typing import Iterable, List
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from dotenv import load_dotenv
 from openai import AsyncOpenAI, OpenAI
 
+from aimakerspace.openai_utils.embedding_cache import (
+    EmbeddingCache,
+    embedding_cache_key,
+)
+from aimakerspace.openai_utils.rate_limit import (
+    AsyncTokenBucket,
+    call_with_retries,
+    estimate_tokens,
+    plan_batches,
+)
 
-class EmbeddingModel:
-    """Helper for generating embeddings via the OpenAI API."""
 
-    def __init__(self, embeddings_model_name: str = "text-embedding-3-small"):
+class EmbeddingModel:
+    """Helper for generating embeddings via the OpenAI API.
+
+    When a ``cache`` is supplied, texts already embedded with the same model
+    are served from it and only the misses are sent to the API.
+
+    Requests are split into batches of at most ``max_batch_tokens`` estimated
+    tokens and ``batch_size`` inputs. The async path keeps at most
+    ``max_concurrency`` batches in flight, optionally paces them to
+    ``tokens_per_minute`` and retries a failed batch on its own with
+    exponential backoff that honours ``Retry-After``.
+
+    ``dimensions`` asks ``text-embedding-3-*`` models for shortened vectors;
+    cached entries are keyed by model and dimensions together.
+    """
+
+    def __init__(
+        self,
+        embeddings_model_name: str = "text-embedding-3-small",
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = 1024,
+        max_batch_tokens: int = 250_000,
+        max_concurrency: int = 4,
+        tokens_per_minute: Optional[int] = None,
+        max_retries: int = 6,
+        dimensions: Optional[int] = None,
+    ):
         load_dotenv()
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         if self.openai_api_key is None:
@@ -19,44 +53,122 @@ class EmbeddingModel:
             )
 
         self.embeddings_model_name = embeddings_model_name
-        self.async_client = AsyncOpenAI()
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.dimensions = dimensions
+        self._token_bucket = (
+            AsyncTokenBucket(tokens_per_minute) if tokens_per_minute else None
+        )
+        # Retries for the async path are handled per batch by call_with_retries.
+        self.async_client = AsyncOpenAI(max_retries=0)
         self.client = OpenAI()
 
-    async def async_get_embeddings(self, list_of_text: Iterable[str]) -> List[List[float]]:
+    async def async_get_embeddings(
+        self, list_of_text: Iterable[str]
+    ) -> List[List[float]]:
         """Return embeddings for ``list_of_text`` using the async client."""
 
-        embedding_response = await self.async_client.embeddings.create(
-            input=list(list_of_text), model=self.embeddings_model_name
-        )
+        texts = list(list_of_text)
+        embeddings, missing = self._lookup(texts)
+        if missing:
+            self._remember(missing, await self._async_request(missing), embeddings)
 
-        return [item.embedding for item in embedding_response.data]
+        return [embeddings[text] for text in texts]
 
     async def async_get_embedding(self, text: str) -> List[float]:
         """Return an embedding for a single text using the async client."""
 
-        embedding = await self.async_client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
-
-        return embedding.data[0].embedding
+        return (await self.async_get_embeddings([text]))[0]
 
     def get_embeddings(self, list_of_text: Iterable[str]) -> List[List[float]]:
         """Return embeddings for ``list_of_text`` using the sync client."""
 
-        embedding_response = self.client.embeddings.create(
-            input=list(list_of_text), model=self.embeddings_model_name
-        )
+        texts = list(list_of_text)
+        embeddings, missing = self._lookup(texts)
+        if missing:
+            vectors: List[List[float]] = []
+            for batch in self._plan(missing):
+                embedding_response = self.client.embeddings.create(
+                    input=batch, **self._request_options()
+                )
+                vectors.extend(item.embedding for item in embedding_response.data)
+            self._remember(missing, vectors, embeddings)
 
-        return [item.embedding for item in embedding_response.data]
+        return [embeddings[text] for text in texts]
 
     def get_embedding(self, text: str) -> List[float]:
         """Return an embedding for a single text using the sync client."""
 
-        embedding = self.client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
+        return self.get_embeddings([text])[0]
+
+    async def _async_request(self, texts: List[str]) -> List[List[float]]:
+        """Embed ``texts`` with bounded concurrency and per-batch retries."""
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async def request() -> List[List[float]]:
+                if self._token_bucket is not None:
+                    await self._token_bucket.acquire(
+                        sum(estimate_tokens(text) for text in batch)
+                    )
+                embedding_response = await self.async_client.embeddings.create(
+                    input=batch, **self._request_options()
+                )
+                return [item.embedding for item in embedding_response.data]
 
-        return embedding.data[0].embedding
+            async with semaphore:
+                return await call_with_retries(request, max_retries=self.max_retries)
+
+        results = await asyncio.gather(
+            *(embed_batch(batch) for batch in self._plan(texts))
+        )
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def _plan(self, texts: List[str]) -> List[List[str]]:
+        return plan_batches(texts, self.max_batch_tokens, self.batch_size)
+
+    def _request_options(self) -> Dict[str, object]:
+        options: Dict[str, object] = {"model": self.embeddings_model_name}
+        if self.dimensions is not None:
+            options["dimensions"] = self.dimensions
+        return options
+
+    def _cache_key(self, text: str) -> bytes:
+        model_name = self.embeddings_model_name
+        if self.dimensions is not None:
+            model_name = f"{model_name}@{self.dimensions}"
+        return embedding_cache_key(model_name, text)
+
+    def _lookup(self, texts: List[str]) -> Tuple[Dict[str, List[float]], List[str]]:
+        """Split ``texts`` into cached embeddings and unique texts to request."""
+
+        unique_texts = list(dict.fromkeys(texts))
+        if self.cache is None:
+            return {}, unique_texts
+
+        keys = {text: self._cache_key(text) for text in unique_texts}
+        cached = self.cache.get_many(keys.values())
+        embeddings = {text: cached[key] for text, key in keys.items() if key in cached}
+        missing = [text for text in unique_texts if text not in embeddings]
+        return embeddings, missing
+
+    def _remember(
+        self,
+        texts: List[str],
+        vectors: List[List[float]],
+        embeddings: Dict[str, List[float]],
+    ) -> None:
+        """Merge freshly fetched ``vectors`` into ``embeddings`` and the cache."""
+
+        embeddings.update(zip(texts, vectors))
+        if self.cache is not None:
+            self.cache.set_many(
+                {self._cache_key(text): vector for text, vector in zip(texts, vectors)}
+            )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Union
+
+import numpy as np
+
+# Rough per-entry bookkeeping cost (digest, dict slot, array header).
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+def embedding_cache_key(model_name: str, text: str) -> bytes:
+    """Return the content address of ``text`` embedded with ``model_name``."""
+
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with an optional SQLite tier.
+
+    Entries live in an in-process LRU bounded by ``max_bytes``; evicted
+    entries remain available from the on-disk tier when ``path`` is given.
+    Vectors are stored as ``float32``, which is the precision the embeddings
+    API returns. Any object offering ``get_many``/``set_many`` with the same
+    signatures can be passed to :class:`EmbeddingModel` instead.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 256 * 1024 * 1024,
+        path: Optional[Union[str, Path]] = None,
+    ):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be a positive integer")
+
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._connection = sqlite3.connect(str(path), check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._connection.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        """Approximate memory held by the in-process tier."""
+
+        return self._size_bytes
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, List[float]]:
+        """Return the cached embeddings for whichever ``keys`` are present."""
+
+        requested = list(keys)
+        found: Dict[bytes, List[float]] = {}
+        with self._lock:
+            missing: List[bytes] = []
+            for key in requested:
+                vector = self._entries.get(key)
+                if vector is None:
+                    missing.append(key)
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = vector.tolist()
+
+            if missing and self._connection is not None:
+                for key, vector in self._read_disk(missing).items():
+                    self._remember(key, vector)
+                    found[key] = vector.tolist()
+
+            self.hits += len(found)
+            self.misses += len(requested) - len(found)
+        return found
+
+    def set_many(self, items: Mapping[bytes, Iterable[float]]) -> None:
+        """Store ``items`` in memory and, if configured, on disk."""
+
+        vectors = {
+            key: np.asarray(vector, dtype=np.float32) for key, vector in items.items()
+        }
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+            if self._connection is not None:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in vectors.items()],
+                )
+                self._connection.commit()
+
+    def clear(self) -> None:
+        """Drop every in-memory entry; the on-disk tier is left untouched."""
+
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def close(self) -> None:
+        """Close the on-disk tier, if any."""
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size_bytes -= previous.nbytes + _ENTRY_OVERHEAD_BYTES
+        self._entries[key] = vector
+        self._size_bytes += vector.nbytes + _ENTRY_OVERHEAD_BYTES
+        while self._size_bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._size_bytes -= evicted.nbytes + _ENTRY_OVERHEAD_BYTES
+
+    def _read_disk(
+        self, keys: List[bytes], chunk_size: int = 500
+    ) -> Dict[bytes, np.ndarray]:
+        found: Dict[bytes, np.ndarray] = {}
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start : start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                chunk,
+            )
+            for key, blob in rows:
+                found[bytes(key)] = np.frombuffer(blob, dtype=np.float32).copy()
+        return found
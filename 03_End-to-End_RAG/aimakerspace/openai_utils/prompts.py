@@ -1,25 +1,64 @@
 import re
-from typing import Any, Dict, List
+import string
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+_PLACEHOLDER_PATTERN = re.compile(r"\{([^}]+)\}")
+# A str.format field that resolves to a plain keyword (no attribute/index access).
+_FIELD_NAME = re.compile(r"[^.\[\]]+")
+_FORMATTER = string.Formatter()
+
+
+@lru_cache(maxsize=256)
+def compile_template(template: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """Parse ``template`` once into ``(literal, field)`` pairs, cached by text.
+
+    Escaped braces are resolved exactly as ``str.format`` would; ``field`` is
+    ``None`` for trailing text.
+    """
+
+    segments = []
+    for literal, field, format_spec, conversion in _FORMATTER.parse(template):
+        if field is not None and (
+            conversion
+            or format_spec
+            or field.isdigit()
+            or not _FIELD_NAME.fullmatch(field)
+        ):
+            raise ValueError(f"Unsupported placeholder {{{field}}} in prompt template")
+        segments.append((literal, field))
+    return tuple(segments)
+
+
+@lru_cache(maxsize=256)
+def _input_variables(template: str) -> Tuple[str, ...]:
+    return tuple(_PLACEHOLDER_PATTERN.findall(template))
 
 
 class BasePrompt:
-    """Simple string template helper used to format prompt text."""
+    """Simple string template helper used to format prompt text.
+
+    Templates are compiled on first use and cached by their text, so each
+    call is a single join over precomputed segments.
+    """
 
     def __init__(self, prompt: str):
         self.prompt = prompt
-        self._pattern = re.compile(r"\{([^}]+)\}")
 
     def format_prompt(self, **kwargs: Any) -> str:
         """Return the prompt with ``kwargs`` substituted for placeholders."""
 
-        matches = self._pattern.findall(self.prompt)
-        replacements = {match: kwargs.get(match, "") for match in matches}
-        return self.prompt.format(**replacements)
+        parts: List[str] = []
+        for literal, field in compile_template(self.prompt):
+            parts.append(literal)
+            if field is not None:
+                parts.append(format(kwargs.get(field, "")))
+        return "".join(parts)
 
     def get_input_variables(self) -> List[str]:
         """Return the placeholder names used by this prompt."""
 
-        return self._pattern.findall(self.prompt)
+        return list(_input_variables(self.prompt))
 
 
 class RolePrompt(BasePrompt):
@@ -29,7 +68,9 @@ class RolePrompt(BasePrompt):
         super().__init__(prompt)
         self.role = role
 
-    def create_message(self, apply_format: bool = True, **kwargs: Any) -> Dict[str, str]:
+    def create_message(
+        self, apply_format: bool = True, **kwargs: Any
+    ) -> Dict[str, str]:
         """Build an OpenAI chat message dictionary for this prompt."""
 
         content = self.format_prompt(**kwargs) if apply_format else self.prompt
@@ -0,0 +1,146 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, List, Optional, Sequence, TypeVar
+
+import openai
+
+T = TypeVar("T")
+
+# Planned batches stay this far below the caller's token cap, since the
+# estimate below is not exact for code or non-English text.
+BATCH_TOKEN_MARGIN = 0.8
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, deliberately high token estimate (~3 characters per token).
+
+    English prose averages about four characters per token; code, numbers
+    and non-English text run denser, so this over-counts the common case.
+    """
+
+    return len(text) // 3 + 1
+
+
+def plan_batches(
+    texts: Sequence[str], max_batch_tokens: int, max_batch_size: int
+) -> List[List[str]]:
+    """Group ``texts`` into ordered batches bounded by tokens and item count.
+
+    Batches are filled to ``BATCH_TOKEN_MARGIN`` of ``max_batch_tokens``. A
+    single text larger than that still gets its own batch so that the API,
+    not this helper, decides whether it is too long.
+    """
+
+    max_batch_tokens = int(max_batch_tokens * BATCH_TOKEN_MARGIN)
+    batches: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and (
+            current_tokens + tokens > max_batch_tokens or len(current) >= max_batch_size
+        ):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def retry_delay(
+    error: Exception, attempt: int, base_delay: float, max_delay: float
+) -> float:
+    """Seconds to wait before retry ``attempt`` (0-based) after ``error``.
+
+    A ``Retry-After`` header from the server wins; otherwise use exponential
+    backoff with full jitter.
+    """
+
+    retry_after = _retry_after_seconds(error)
+    if retry_after is not None:
+        return min(retry_after, max_delay)
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+async def call_with_retries(
+    request: Callable[[], Awaitable[T]],
+    max_retries: int = 6,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+) -> T:
+    """Await ``request()``, retrying rate-limit and transient API errors."""
+
+    attempt = 0
+    while True:
+        try:
+            return await request()
+        except RETRYABLE_ERRORS as exc:
+            if attempt >= max_retries:
+                raise
+            await asyncio.sleep(retry_delay(exc, attempt, base_delay, max_delay))
+            attempt += 1
+
+
+class AsyncTokenBucket:
+    """Token bucket that paces requests to a tokens-per-minute quota."""
+
+    def __init__(self, tokens_per_minute: int):
+        if tokens_per_minute <= 0:
+            raise ValueError("tokens_per_minute must be a positive integer")
+
+        self.capacity = float(tokens_per_minute)
+        self.refill_per_second = tokens_per_minute / 60.0
+        self._available = self.capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait until ``tokens`` can be spent without exceeding the quota."""
+
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            now = time.monotonic()
+            self._available = min(
+                self.capacity,
+                self._available + (now - self._updated) * self.refill_per_second,
+            )
+            self._updated = now
+            if self._available >= tokens:
+                self._available -= tokens
+                return
+            await asyncio.sleep((tokens - self._available) / self.refill_per_second)
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,154 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Case-fold ``text`` and collapse whitespace so trivial variants match."""
+
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def freeze_filter(filter: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Return a hashable, order-independent form of a metadata filter."""
+
+    if filter is None:
+        return None
+    return json.dumps(filter, sort_keys=True, default=repr)
+
+
+class _TTLCache:
+    """A small LRU mapping whose entries also expire ``ttl`` seconds after set."""
+
+    def __init__(self, max_entries: int, ttl: Optional[float]):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = float("inf") if self.ttl is None else time.monotonic() + self.ttl
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class QueryCache:
+    """Two-level cache for :meth:`VectorDatabase.search_by_text`.
+
+    The first level maps a normalised query text to its embedding, saving the
+    API round-trip; the second maps ``(query, k, distance, filter)`` to the
+    ranked results, saving the scan as well. Both levels are LRU-bounded and
+    entries expire after ``ttl`` seconds (``None`` keeps them until evicted).
+
+    Results are tagged with the store's ``version``: the first lookup after
+    any insert, upsert or delete drops every cached result, while cached
+    embeddings stay valid. Results computed against an older version than
+    the cache has already seen are discarded rather than stored, so a slow
+    search finishing after a write cannot flush the newer entries. Use one
+    cache per store, since versions of different stores are unrelated. Hit
+    and miss counters are kept per level and summarised by :meth:`stats`.
+    """
+
+    def __init__(
+        self,
+        max_embeddings: int = 10_000,
+        max_results: int = 10_000,
+        ttl: Optional[float] = 3600.0,
+    ):
+        if max_embeddings <= 0 or max_results <= 0:
+            raise ValueError("max_embeddings and max_results must be positive")
+
+        self._embeddings = _TTLCache(max_embeddings, ttl)
+        self._results = _TTLCache(max_results, ttl)
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get_embedding(self, query_text: str) -> Optional[List[float]]:
+        with self._lock:
+            return self._embeddings.get(normalize_query(query_text))
+
+    def set_embedding(self, query_text: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._embeddings.set(normalize_query(query_text), embedding)
+
+    def get_results(
+        self, key: Tuple, version: int
+    ) -> Optional[List[Tuple[Any, float]]]:
+        with self._lock:
+            if not self._sync_version(version):
+                self._results.misses += 1
+                return None
+            results = self._results.get(key)
+        return None if results is None else list(results)
+
+    def set_results(
+        self, key: Tuple, version: int, results: List[Tuple[Any, float]]
+    ) -> None:
+        with self._lock:
+            if self._sync_version(version):
+                self._results.set(key, tuple(results))
+
+    def results_key(
+        self,
+        query_text: str,
+        k: int,
+        distance_measure: Any,
+        filter: Optional[Dict[str, Any]],
+    ) -> Tuple:
+        """Build the result-level key for a text query."""
+
+        return (normalize_query(query_text), k, distance_measure, freeze_filter(filter))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._embeddings.clear()
+            self._results.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Entry counts and hit/miss counters for both levels."""
+
+        with self._lock:
+            return {
+                "embedding_entries": len(self._embeddings),
+                "embedding_hits": self._embeddings.hits,
+                "embedding_misses": self._embeddings.misses,
+                "result_entries": len(self._results),
+                "result_hits": self._results.hits,
+                "result_misses": self._results.misses,
+            }
+
+    def _sync_version(self, version: int) -> bool:
+        """Move to ``version`` if it is newer; False if it is already stale."""
+
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            self._results.clear()
+            self._version = version
+        return True
@@ -0,0 +1,166 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from aimakerspace.context_packing import ContextPacker
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI
+from aimakerspace.openai_utils.prompts import SystemRolePrompt, UserRolePrompt
+from aimakerspace.vectordatabase import VectorDatabase
+
+DEFAULT_SYSTEM_PROMPT = SystemRolePrompt(
+    "You are a helpful assistant. Answer the question using only the provided "
+    "context. If the context does not contain the answer, say that you don't "
+    "know."
+)
+DEFAULT_USER_PROMPT = UserRolePrompt("Context:\n{context}\n\nQuestion:\n{user_query}")
+# Placeholders the pipeline fills itself, besides ``user_query``.
+_RESERVED_PROMPT_KWARGS = ("context", "context_count")
+
+
+class StreamingRAGPipeline:
+    """Async retrieve-then-generate pipeline that streams answer tokens.
+
+    Retrieval goes through :meth:`VectorDatabase.asearch_by_text`, so a store
+    with a ``query_cache`` answers repeated questions without embedding or
+    scanning, and fresh scans run off the event loop. The answer is streamed
+    with :meth:`ChatOpenAI.astream` (keyed on the bare question if the model
+    has a semantic cache). Each :class:`RAGStream` records per-stage
+    timings, including time to first token.
+
+    With a ``packer`` the ``k`` results are treated as candidates and packed
+    into its token budget (merging overlapping chunks and dropping
+    near-duplicates) before they are formatted, so ``k`` can be generous.
+    """
+
+    def __init__(
+        self,
+        llm: ChatOpenAI,
+        vector_db: VectorDatabase,
+        system_prompt: SystemRolePrompt = DEFAULT_SYSTEM_PROMPT,
+        user_prompt: UserRolePrompt = DEFAULT_USER_PROMPT,
+        k: int = 4,
+        packer: Optional[ContextPacker] = None,
+    ):
+        self.llm = llm
+        self.vector_db = vector_db
+        self.system_prompt = system_prompt
+        self.user_prompt = user_prompt
+        self.k = k
+        self.packer = packer
+
+    def stream(
+        self, user_query: str, k: Optional[int] = None, **prompt_kwargs: Any
+    ) -> "RAGStream":
+        """Return an async iterator over the answer tokens for ``user_query``.
+
+        ``prompt_kwargs`` fill any extra placeholders of the two prompts;
+        ``context`` and ``context_count`` are filled by the pipeline and may
+        not be passed.
+        """
+
+        reserved = [name for name in _RESERVED_PROMPT_KWARGS if name in prompt_kwargs]
+        if reserved:
+            raise ValueError(
+                f"prompt_kwargs may not set {', '.join(reserved)}; "
+                "the pipeline fills them"
+            )
+        return RAGStream(self, user_query, k or self.k, prompt_kwargs)
+
+    async def arun(
+        self, user_query: str, k: Optional[int] = None, **prompt_kwargs: Any
+    ) -> Dict[str, Any]:
+        """Run the pipeline to completion and return answer, context and timings."""
+
+        stream = self.stream(user_query, k, **prompt_kwargs)
+        async for _ in stream:
+            pass
+        return {
+            "response": stream.answer,
+            "context": stream.contexts,
+            "timings": stream.timings,
+        }
+
+    @staticmethod
+    def format_context(contexts: List[Tuple[str, float]]) -> str:
+        return "\n\n".join(
+            f"[Source {position}]: {text}"
+            for position, (text, _) in enumerate(contexts, 1)
+        )
+
+
+class RAGStream:
+    """One streamed answer; iterate it once with ``async for``.
+
+    After iteration :attr:`answer` holds the full text, :attr:`contexts` the
+    retrieved ``(text, score)`` pairs and :attr:`timings` the stage
+    durations in milliseconds: ``embed_ms`` and ``search_ms`` (as reported
+    by :meth:`VectorDatabase.asearch_by_texts`) and ``format_ms``, plus
+    ``time_to_first_token_ms`` and ``total_ms`` measured from the start.
+    """
+
+    def __init__(
+        self,
+        pipeline: StreamingRAGPipeline,
+        user_query: str,
+        k: int,
+        prompt_kwargs: Dict[str, Any],
+    ):
+        self.pipeline = pipeline
+        self.user_query = user_query
+        self.k = k
+        self.prompt_kwargs = prompt_kwargs
+        self.answer = ""
+        self.contexts: List[Tuple[str, float]] = []
+        self.timings: Dict[str, float] = {}
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._generate()
+
+    async def _generate(self) -> AsyncIterator[str]:
+        pipeline = self.pipeline
+        start = last = time.perf_counter()
+
+        def lap(stage: str) -> None:
+            nonlocal last
+            now = time.perf_counter()
+            self.timings[stage] = 1000 * (now - last)
+            last = now
+
+        retrieval = asyncio.ensure_future(
+            pipeline.vector_db.asearch_by_text(
+                self.user_query, self.k, timings=self.timings
+            )
+        )
+        try:
+            # Let the embedding request go out, then build the system message
+            # while it is in flight.
+            await asyncio.sleep(0)
+            system_message = pipeline.system_prompt.create_message(**self.prompt_kwargs)
+            self.contexts = await retrieval
+        finally:
+            retrieval.cancel()
+        last = time.perf_counter()
+
+        if pipeline.packer is not None:
+            self.contexts = pipeline.packer.pack(self.contexts).contexts
+        user_message = pipeline.user_prompt.create_message(
+            user_query=self.user_query,
+            context=pipeline.format_context(self.contexts),
+            context_count=len(self.contexts),
+            **self.prompt_kwargs,
+        )
+        lap("format_ms")
+
+        parts: List[str] = []
+        async for token in pipeline.llm.astream(
+            [system_message, user_message], cache_query=self.user_query
+        ):
+            if not parts:
+                self.timings["time_to_first_token_ms"] = 1000 * (
+                    time.perf_counter() - start
+                )
+            parts.append(token)
+            yield token
+
+        self.answer = "".join(parts)
+        self.timings["total_ms"] = 1000 * (time.perf_counter() - start)
@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.vectordatabase import VectorDatabase
+
+# Nearest questions checked per lookup, so an expired best match can fall
+# through to a live one just behind it.
+_LOOKUP_CANDIDATES = 4
+
+
+class SemanticCache:
+    """Answer cache that also matches paraphrased questions.
+
+    Questions are embedded and kept in a small dedicated
+    :class:`VectorDatabase`; a lookup returns the stored answer of the
+    nearest past question within the same ``scope`` when its cosine
+    similarity is at least ``threshold``. Entries expire ``ttl`` seconds
+    after they were stored (overridable per entry), and once more than
+    ``max_entries`` are held the oldest are evicted first. Expired entries
+    are skipped and dropped when a lookup meets them; a full sweep runs at
+    most every ``purge_interval`` seconds.
+
+    Callers that look up and then store the same question can embed it once
+    with :meth:`embed` and pass the vector to both as ``embedding``.
+    """
+
+    def __init__(
+        self,
+        embedding_model: Optional[EmbeddingModel] = None,
+        threshold: float = 0.92,
+        max_entries: int = 10_000,
+        ttl: Optional[float] = 24 * 3600.0,
+        purge_interval: float = 60.0,
+    ):
+        if not -1.0 <= threshold <= 1.0:
+            raise ValueError("threshold must be between -1 and 1")
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer")
+
+        self.embedding_model = embedding_model or EmbeddingModel()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.hits = 0
+        self.misses = 0
+        self._store = VectorDatabase(embedding_model=self.embedding_model)
+        # Record id -> (expiry time, answer), in insertion order for eviction.
+        self._entries: "OrderedDict[int, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def embed(self, question: str) -> List[float]:
+        """Embed ``question`` for use as ``embedding`` in later calls."""
+
+        return self.embedding_model.get_embedding(question)
+
+    async def aembed(self, question: str) -> List[float]:
+        """Async :meth:`embed` using the async embeddings client."""
+
+        return await self.embedding_model.async_get_embedding(question)
+
+    def lookup(
+        self,
+        question: str,
+        scope: str = "",
+        embedding: Optional[List[float]] = None,
+    ) -> Optional[str]:
+        """Return a cached answer for ``question``, or ``None`` on a miss."""
+
+        if embedding is None:
+            embedding = self.embed(question)
+        return self._match(embedding, scope)
+
+    async def alookup(
+        self,
+        question: str,
+        scope: str = "",
+        embedding: Optional[List[float]] = None,
+    ) -> Optional[str]:
+        """Async :meth:`lookup` using the async embeddings client."""
+
+        if embedding is None:
+            embedding = await self.aembed(question)
+        return self._match(embedding, scope)
+
+    def store(
+        self,
+        question: str,
+        answer: str,
+        scope: str = "",
+        ttl: Optional[float] = None,
+        embedding: Optional[List[float]] = None,
+    ) -> None:
+        """Remember ``answer`` for ``question`` within ``scope``."""
+
+        if embedding is None:
+            embedding = self.embed(question)
+        self._add(embedding, question, answer, scope, ttl)
+
+    async def astore(
+        self,
+        question: str,
+        answer: str,
+        scope: str = "",
+        ttl: Optional[float] = None,
+        embedding: Optional[List[float]] = None,
+    ) -> None:
+        """Async :meth:`store` using the async embeddings client."""
+
+        if embedding is None:
+            embedding = await self.aembed(question)
+        self._add(embedding, question, answer, scope, ttl)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._store.delete(list(self._entries))
+            self._entries.clear()
+
+    def _match(self, vector: List[float], scope: str) -> Optional[str]:
+        with self._lock:
+            self._maybe_purge()
+            hits = (
+                self._store.search_ids(
+                    vector, _LOOKUP_CANDIDATES, filter={"scope": scope}
+                )
+                if self._entries
+                else []
+            )
+            now = time.monotonic()
+            expired: List[int] = []
+            answer = None
+            for record_id, score in hits:
+                if score < self.threshold:
+                    break
+                expires_at, cached = self._entries[record_id]
+                if expires_at > now:
+                    answer = cached
+                    break
+                expired.append(record_id)
+            self._forget(expired)
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return answer
+
+    def _add(
+        self,
+        vector: List[float],
+        question: str,
+        answer: str,
+        scope: str,
+        ttl: Optional[float],
+    ) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = float("inf") if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            (record_id,) = self._store.add([vector], [question], [{"scope": scope}])
+            self._entries[record_id] = (expires_at, answer)
+            self._maybe_purge()
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                evicted = [
+                    self._entries.popitem(last=False)[0] for _ in range(overflow)
+                ]
+                self._store.delete(evicted)
+
+    def _maybe_purge(self) -> None:
+        now = time.monotonic()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        self._forget(
+            [
+                record_id
+                for record_id, (expires_at, _) in self._entries.items()
+                if expires_at <= now
+            ]
+        )
+
+    def _forget(self, record_ids: List[int]) -> None:
+        for record_id in record_ids:
+            del self._entries[record_id]
+        if record_ids:
+            self._store.delete(record_ids)
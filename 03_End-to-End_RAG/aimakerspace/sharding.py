@@ -0,0 +1,399 @@
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.vectordatabase import (
+    MetadataFilter,
+    VectorDatabase,
+    _save_json,
+    cosine_similarity,
+)
+
+_SHARDS_FILE = "shards.json"
+
+# (id, score, payload) as produced by one shard for one query.
+_Hit = Tuple[int, float, Union[str, int]]
+
+
+def _shard_directory(root: Path, shard: int) -> Path:
+    return root / f"shard-{shard:03d}"
+
+
+_COMMANDS: Dict[str, Callable[..., Any]] = {
+    "search": VectorDatabase.search_records,
+    "upsert": VectorDatabase.upsert,
+    "delete": VectorDatabase.delete,
+    "len": VectorDatabase.__len__,
+}
+
+
+def _serve_shard(connection, directory: str, load_options: Dict[str, Any]) -> None:
+    """Worker loop: load one shard memory-mapped and answer commands."""
+
+    vector_db = VectorDatabase.load(directory, mmap=True, **load_options)
+    while True:
+        command, args = connection.recv()
+        if command == "close":
+            connection.close()
+            return
+        try:
+            if command == "save":
+                result = vector_db.save(directory)
+            else:
+                result = _COMMANDS[command](vector_db, *args)
+        except Exception as error:  # re-raised in the parent by _broadcast
+            connection.send((False, error))
+        else:
+            connection.send((True, result))
+
+
+class ShardedVectorDatabase:
+    """A :class:`VectorDatabase` partitioned across worker processes.
+
+    Records are routed to shard ``id % n_shards``. Each shard lives in its own
+    directory under ``path`` and is loaded memory-mapped by a dedicated
+    worker, so the vectors stay in the shared page cache rather than in the
+    parent. A query is sent to every shard at once and the per-shard top-k
+    lists are merged with a heap; the search methods mirror those of
+    :class:`VectorDatabase`.
+
+    Open an existing layout directly, or create one with :meth:`create` or
+    :meth:`from_vector_db`. Changes made through :meth:`add`, :meth:`upsert`
+    and :meth:`delete` live in the workers until :meth:`save`. Call
+    :meth:`close` (or use the instance as a context manager) to stop them.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        embedding_model: Optional[EmbeddingModel] = None,
+        mp_context: str = "spawn",
+        **load_options: Any,
+    ):
+        self.path = Path(path)
+        with (self.path / _SHARDS_FILE).open("r", encoding="utf-8") as handle:
+            manifest = json.load(handle)
+
+        self._embedding_model = embedding_model
+        self.n_shards: int = manifest["n_shards"]
+        self._next_id: int = manifest["next_id"]
+        # A pipe carries one request/response at a time; the lock keeps
+        # concurrent callers from interleaving on it.
+        self._lock = threading.Lock()
+        self._connections = []
+        self._processes = []
+        context = multiprocessing.get_context(mp_context)
+        for shard in range(self.n_shards):
+            parent_end, child_end = context.Pipe()
+            process = context.Process(
+                target=_serve_shard,
+                args=(child_end, str(_shard_directory(self.path, shard)), load_options),
+                daemon=True,
+            )
+            process.start()
+            child_end.close()
+            self._connections.append(parent_end)
+            self._processes.append(process)
+
+    @property
+    def embedding_model(self) -> EmbeddingModel:
+        """Model for text queries, created on first use if none was given."""
+
+        if self._embedding_model is None:
+            self._embedding_model = EmbeddingModel()
+        return self._embedding_model
+
+    @embedding_model.setter
+    def embedding_model(self, embedding_model: EmbeddingModel) -> None:
+        self._embedding_model = embedding_model
+
+    @classmethod
+    def create(
+        cls,
+        path: Union[str, Path],
+        n_shards: Optional[int] = None,
+        embedding_model: Optional[EmbeddingModel] = None,
+        **kwargs: Any,
+    ) -> "ShardedVectorDatabase":
+        """Lay out ``n_shards`` empty shards (default: one per CPU) and open them."""
+
+        empty = VectorDatabase(embedding_model=embedding_model)
+        return cls._write_layout(
+            path,
+            [empty] * (n_shards or os.cpu_count() or 1),
+            0,
+            embedding_model,
+            kwargs,
+        )
+
+    @classmethod
+    def from_vector_db(
+        cls,
+        vector_db: VectorDatabase,
+        path: Union[str, Path],
+        n_shards: Optional[int] = None,
+        **kwargs: Any,
+    ) -> "ShardedVectorDatabase":
+        """Partition the live records of ``vector_db`` into a sharded layout."""
+
+        n_shards = n_shards or os.cpu_count() or 1
+        shards = [
+            VectorDatabase(embedding_model=vector_db._embedding_model)
+            for _ in range(n_shards)
+        ]
+        for ids, vectors, texts, metadata in vector_db.iter_records():
+            for shard, shard_db in enumerate(shards):
+                positions = np.flatnonzero(ids % n_shards == shard)
+                shard_db.upsert(
+                    ids[positions],
+                    vectors[positions],
+                    [texts[position] for position in positions],
+                    [metadata[position] for position in positions],
+                )
+        return cls._write_layout(
+            path, shards, vector_db.next_id, vector_db._embedding_model, kwargs
+        )
+
+    def __len__(self) -> int:
+        return sum(self._broadcast("len", [()] * self.n_shards))
+
+    def __enter__(self) -> "ShardedVectorDatabase":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def add(
+        self,
+        vectors: Iterable[Iterable[float]],
+        texts: Optional[Sequence[Optional[str]]] = None,
+        metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    ) -> List[int]:
+        """Store new records under fresh ids and return the ids."""
+
+        batch = np.asarray(
+            [np.asarray(vector, dtype=np.float32) for vector in vectors],
+            dtype=np.float32,
+        )
+        ids = list(range(self._next_id, self._next_id + batch.shape[0]))
+        self.upsert(ids, batch, texts, metadata)
+        return ids
+
+    def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: Iterable[Iterable[float]],
+        texts: Optional[Sequence[Optional[str]]] = None,
+        metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    ) -> None:
+        """Insert or replace records on the shards that own their ids."""
+
+        if len(ids) == 0:
+            return
+
+        ids = np.asarray(ids, dtype=np.int64)
+        batch = np.asarray(
+            [np.asarray(vector, dtype=np.float32) for vector in vectors],
+            dtype=np.float32,
+        )
+        texts = texts if texts is not None else [None] * len(ids)
+        metadata = metadata if metadata is not None else [None] * len(ids)
+        if not batch.shape[0] == len(ids) == len(texts) == len(metadata):
+            raise ValueError(
+                "ids, vectors, texts and metadata must have the same length"
+            )
+
+        shards = ids % self.n_shards
+        requests = []
+        for shard in range(self.n_shards):
+            positions = np.flatnonzero(shards == shard)
+            requests.append(
+                (
+                    ids[positions].tolist(),
+                    batch[positions],
+                    [texts[position] for position in positions],
+                    [metadata[position] for position in positions],
+                )
+            )
+        self._broadcast("upsert", requests)
+        self._next_id = max(self._next_id, int(ids.max()) + 1)
+
+    def delete(self, ids: Iterable[int]) -> int:
+        """Delete records by id and return how many existed."""
+
+        per_shard: List[List[int]] = [[] for _ in range(self.n_shards)]
+        for record_id in ids:
+            per_shard[int(record_id) % self.n_shards].append(int(record_id))
+        return sum(self._broadcast("delete", [(shard,) for shard in per_shard]))
+
+    def save(self) -> None:
+        """Persist every shard in place, together with the id counter."""
+
+        self._broadcast("save", [()] * self.n_shards)
+        _write_manifest(self.path, self.n_shards, self._next_id)
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+
+        with self._lock:
+            for connection in self._connections:
+                try:
+                    connection.send(("close", ()))
+                    connection.close()
+                except (BrokenPipeError, OSError):
+                    pass
+            for process in self._processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            self._connections = []
+            self._processes = []
+
+    def search(
+        self,
+        query_vector: Iterable[float],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[Tuple[str, float]]:
+        """Return the ``k`` records most similar to ``query_vector``."""
+
+        return self.search_batch([query_vector], k, distance_measure, filter=filter)[0]
+
+    def search_ids(
+        self,
+        query_vector: Iterable[float],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[Tuple[int, float]]:
+        """Like :meth:`search` but return ``(id, score)`` pairs."""
+
+        hits = self._search_hits([query_vector], k, distance_measure, False, filter)
+        return [(record_id, score) for record_id, score, _ in hits[0]]
+
+    def search_batch(
+        self,
+        query_vectors: Iterable[Iterable[float]],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        exact: bool = False,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Return the top ``k`` results for every vector in ``query_vectors``."""
+
+        return [
+            [(payload, score) for _, score, payload in hits]
+            for hits in self._search_hits(
+                query_vectors, k, distance_measure, exact, filter
+            )
+        ]
+
+    def search_by_text(
+        self,
+        query_text: str,
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        return_as_text: bool = False,
+        filter: Optional[MetadataFilter] = None,
+    ) -> Union[List[Tuple[str, float]], List[str]]:
+        """Vector search using an embedding generated from ``query_text``."""
+
+        query_vector = self.embedding_model.get_embedding(query_text)
+        results = self.search(query_vector, k, distance_measure, filter=filter)
+        if return_as_text:
+            return [result[0] for result in results]
+        return results
+
+    def search_by_texts(
+        self,
+        query_texts: Sequence[str],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        return_as_text: bool = False,
+        filter: Optional[MetadataFilter] = None,
+    ) -> Union[List[List[Tuple[str, float]]], List[List[str]]]:
+        """Embed ``query_texts`` in one request and search them as a batch."""
+
+        if len(query_texts) == 0:
+            return []
+
+        query_vectors = self.embedding_model.get_embeddings(query_texts)
+        results = self.search_batch(query_vectors, k, distance_measure, filter=filter)
+        if return_as_text:
+            return [[result[0] for result in batch] for batch in results]
+        return results
+
+    def _search_hits(
+        self,
+        query_vectors: Iterable[Iterable[float]],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float],
+        exact: bool,
+        filter: Optional[MetadataFilter],
+    ) -> List[List[_Hit]]:
+        """Scatter the queries to every shard and heap-merge their top ``k``."""
+
+        if k <= 0:
+            raise ValueError("k must be a positive integer")
+        queries = np.asarray(
+            [np.asarray(query, dtype=np.float32) for query in query_vectors],
+            dtype=np.float32,
+        )
+        if queries.shape[0] == 0:
+            return []
+
+        args = (queries, k, distance_measure, exact, filter)
+        per_shard = self._broadcast("search", [args] * self.n_shards)
+        return [
+            list(
+                islice(
+                    heapq.merge(*shard_hits, key=lambda hit: -hit[1]),
+                    k,
+                )
+            )
+            for shard_hits in zip(*per_shard)
+        ]
+
+    def _broadcast(self, command: str, args_per_shard: Sequence[tuple]) -> List[Any]:
+        """Send one command to every shard, then collect all the replies."""
+
+        with self._lock:
+            if not self._connections:
+                raise ValueError("ShardedVectorDatabase is closed")
+            for connection, args in zip(self._connections, args_per_shard):
+                connection.send((command, args))
+            replies = [connection.recv() for connection in self._connections]
+
+        for ok, result in replies:
+            if not ok:
+                raise result
+        return [result for _, result in replies]
+
+    @classmethod
+    def _write_layout(
+        cls,
+        path: Union[str, Path],
+        shards: Sequence[VectorDatabase],
+        next_id: int,
+        embedding_model: Optional[EmbeddingModel],
+        kwargs: Dict[str, Any],
+    ) -> "ShardedVectorDatabase":
+        root = Path(path)
+        for shard, shard_db in enumerate(shards):
+            shard_db.save(_shard_directory(root, shard))
+        _write_manifest(root, len(shards), next_id)
+        return cls(root, embedding_model=embedding_model, **kwargs)
+
+
+def _write_manifest(root: Path, n_shards: int, next_id: int) -> None:
+    root.mkdir(parents=True, exist_ok=True)
+    _save_json(root / _SHARDS_FILE, {"n_shards": n_shards, "next_id": next_id})
@@ -1,8 +1,141 @@
+import os
+import re
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Iterable, List
+from typing import (
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    Union,
+    overload,
+)
 
 import PyPDF2
 
+from aimakerspace.context_packing import TokenCounter
+
+# A blank line ends a paragraph; sentence ends and single newlines are
+# weaker boundaries. Each match closes the segment before it.
+_BOUNDARY_PATTERN = re.compile(
+    r"(?P<paragraph>\n[ \t]*\n\s*)|(?<=[.!?])[\"')\]]*\s+|\n\s*"
+)
+_WORD_PATTERN = re.compile(r"\S+\s*")
+
+
+class Chunk:
+    """A view of ``document[start:end]``; the text is sliced only on access."""
+
+    __slots__ = ("document", "doc_id", "start", "end")
+
+    def __init__(self, document: str, doc_id: int, start: int, end: int):
+        self.document = document
+        self.doc_id = doc_id
+        self.start = start
+        self.end = end
+
+    @property
+    def text(self) -> str:
+        return self.document[self.start : self.end]
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __repr__(self) -> str:
+        return f"Chunk(doc_id={self.doc_id}, start={self.start}, end={self.end})"
+
+
+class ChunkList(Sequence[Chunk]):
+    """Chunk offsets over a shared list of source documents.
+
+    Each chunk costs three ``array("q")`` entries (24 bytes) however long
+    its text is; :class:`Chunk` views and chunk strings are only created on
+    access, e.g. one embedding batch at a time via :meth:`iter_batches`.
+    """
+
+    def __init__(self, documents: Optional[List[str]] = None):
+        self.documents: List[str] = documents if documents is not None else []
+        self._doc_ids = array("q")
+        self._starts = array("q")
+        self._ends = array("q")
+
+    def add_document(self, text: str) -> int:
+        """Register a source document and return its id."""
+
+        self.documents.append(text)
+        return len(self.documents) - 1
+
+    def append(self, doc_id: int, start: int, end: int) -> None:
+        self._doc_ids.append(doc_id)
+        self._starts.append(start)
+        self._ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    @overload
+    def __getitem__(self, index: int) -> Chunk: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Chunk]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Chunk, List[Chunk]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        doc_id = self._doc_ids[index]
+        return Chunk(
+            self.documents[doc_id], doc_id, self._starts[index], self._ends[index]
+        )
+
+    def text(self, index: int) -> str:
+        """Materialise the text of chunk ``index``."""
+
+        return self.documents[self._doc_ids[index]][
+            self._starts[index] : self._ends[index]
+        ]
+
+    def texts(self, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Materialise the texts of chunks ``start`` to ``stop``."""
+
+        return [self.text(i) for i in range(*slice(start, stop).indices(len(self)))]
+
+    def iter_batches(self, batch_size: int = 512) -> Iterator[List[str]]:
+        """Yield chunk texts in lists of at most ``batch_size``."""
+
+        if batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer")
+        for start in range(0, len(self), batch_size):
+            yield self.texts(start, start + batch_size)
+
+
+class TextSplitter(Protocol):
+    def iter_split(self, text: str) -> Iterator[str]: ...
+
+    def split(self, text: str) -> List[str]: ...
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]: ...
+
+    def split_chunks(self, texts: Iterable[str]) -> ChunkList: ...
+
+
+def _split_chunks(splitter: TextSplitter, texts: Iterable[str]) -> ChunkList:
+    chunks = ChunkList()
+    for text in texts:
+        doc_id = chunks.add_document(text)
+        for start, end in splitter.iter_spans(text):
+            chunks.append(doc_id, start, end)
+    return chunks
+
 
 class TextFileLoader:
     """Load plain-text documents from a single file or an entire directory."""
@@ -33,20 +166,35 @@ class TextFileLoader:
         self.load()
         return self.documents
 
-    def _iter_documents(self) -> Iterable[str]:
+    def iter_documents(self) -> Iterator[str]:
+        """Yield documents one at a time without storing them on the loader."""
+
+        return iter(self._iter_documents())
+
+    def iter_paths(self) -> Iterator[Path]:
+        """Yield the paths of the text files this loader would read, in order."""
+
         if self.path.is_dir():
-            yield from self._iter_directory(self.path)
+            yield from self._iter_directory_paths(self.path)
         elif self.path.is_file() and self.path.suffix.lower() == ".txt":
-            yield self._read_text_file(self.path)
+            yield self.path
         else:
             raise ValueError(
                 "Provided path must be a directory or a .txt file: " f"{self.path}"
             )
 
+    def _iter_documents(self) -> Iterable[str]:
+        for entry in self.iter_paths():
+            yield self._read_text_file(entry)
+
     def _iter_directory(self, directory: Path) -> Iterable[str]:
+        for entry in self._iter_directory_paths(directory):
+            yield self._read_text_file(entry)
+
+    def _iter_directory_paths(self, directory: Path) -> Iterable[Path]:
         for entry in sorted(directory.rglob("*.txt")):
             if entry.is_file():
-                yield self._read_text_file(entry)
+                yield entry
 
     def _read_text_file(self, file_path: Path) -> str:
         with file_path.open("r", encoding=self.encoding) as file_handle:
@@ -70,23 +218,218 @@ class CharacterTextSplitter:
     def split(self, text: str) -> List[str]:
         """Split ``text`` into chunks preserving the configured overlap."""
 
+        return list(self.iter_split(text))
+
+    def split_texts(self, texts: List[str]) -> List[str]:
+        """Split multiple texts and flatten the resulting chunks."""
+
+        return list(self.iter_split_texts(texts))
+
+    def iter_split(self, text: str) -> Iterator[str]:
+        """Lazily yield the chunks of ``text``."""
+
+        for start, end in self.iter_spans(text):
+            yield text[start:end]
+
+    def iter_split_texts(self, texts: Iterable[str]) -> Iterator[str]:
+        """Lazily yield the chunks of every text in ``texts``."""
+
+        for text in texts:
+            yield from self.iter_split(text)
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield the ``(start, end)`` character offsets of each chunk."""
+
         step = self.chunk_size - self.chunk_overlap
-        return [text[i : i + self.chunk_size] for i in range(0, len(text), step)]
+        for i in range(0, len(text), step):
+            yield i, min(i + self.chunk_size, len(text))
+
+    def split_chunks(self, texts: Iterable[str]) -> ChunkList:
+        """Split ``texts`` into offset-only chunks without copying any text."""
+
+        return _split_chunks(self, texts)
+
+
+class TokenTextSplitter:
+    """Split text into chunks of at most ``chunk_tokens`` tokens.
+
+    Text is cut into sentences (and words, for sentences longer than a
+    chunk) in one pass and packed greedily. When a chunk fills up it ends
+    at the last paragraph break in its second half, if there is one, and
+    the next chunk repeats the trailing whole sentences of the previous one
+    up to ``chunk_overlap`` tokens. Tokens are counted with ``counter``.
+    """
+
+    def __init__(
+        self,
+        chunk_tokens: int = 256,
+        chunk_overlap: int = 32,
+        counter: Optional[TokenCounter] = None,
+    ):
+        if chunk_tokens <= 0:
+            raise ValueError("chunk_tokens must be a positive integer")
+        if not 0 <= 2 * chunk_overlap < chunk_tokens:
+            raise ValueError("chunk_overlap must be less than half of chunk_tokens")
+
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.counter = counter or TokenCounter()
+
+    def split(self, text: str) -> List[str]:
+        """Split ``text`` into token-bounded chunks."""
+
+        return list(self.iter_split(text))
 
     def split_texts(self, texts: List[str]) -> List[str]:
         """Split multiple texts and flatten the resulting chunks."""
 
-        chunks: List[str] = []
+        return list(self.iter_split_texts(texts))
+
+    def iter_split(self, text: str) -> Iterator[str]:
+        """Lazily yield the chunks of ``text``."""
+
+        for start, end in self.iter_spans(text):
+            yield text[start:end]
+
+    def iter_split_texts(self, texts: Iterable[str]) -> Iterator[str]:
+        """Lazily yield the chunks of every text in ``texts``."""
+
         for text in texts:
-            chunks.extend(self.split(text))
-        return chunks
+            yield from self.iter_split(text)
+
+    def split_chunks(self, texts: Iterable[str]) -> ChunkList:
+        """Split ``texts`` into offset-only chunks without copying any text."""
+
+        return _split_chunks(self, texts)
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield the ``(start, end)`` character offsets of each chunk."""
+
+        # Pending segments as (start, end, tokens, ends_paragraph).
+        window: Deque[Tuple[int, int, int, bool]] = deque()
+        total = 0
+        for segment in self._iter_segments(text):
+            while window and total + segment[2] > self.chunk_tokens:
+                cut = self._cut_point(window)
+                start, end = self._span(text, window[0][0], window[cut - 1][1])
+                if start < end:
+                    yield start, end
+                overlap = self._overlap(window, cut)
+                for _ in range(cut):
+                    total -= window.popleft()[2]
+                overlap_tokens = sum(tokens for _, _, tokens, _ in overlap)
+                if total + overlap_tokens + segment[2] <= self.chunk_tokens:
+                    window.extendleft(reversed(overlap))
+                    total += overlap_tokens
+            window.append(segment)
+            total += segment[2]
+        if window:
+            start, end = self._span(text, window[0][0], window[-1][1])
+            # Whitespace-only input (e.g. a blank page) yields no chunk.
+            if start < end:
+                yield start, end
+
+    def _iter_segments(self, text: str) -> Iterator[Tuple[int, int, int, bool]]:
+        start = 0
+        for match in _BOUNDARY_PATTERN.finditer(text):
+            if match.end() > start:
+                yield from self._sized(
+                    text, start, match.end(), match.group("paragraph") is not None
+                )
+                start = match.end()
+        if start < len(text):
+            yield from self._sized(text, start, len(text), True)
+
+    def _sized(
+        self, text: str, start: int, end: int, paragraph: bool
+    ) -> Iterator[Tuple[int, int, int, bool]]:
+        """Yield one segment, or its words if it alone exceeds a chunk."""
+
+        tokens = self.counter.count(text[start:end])
+        if tokens <= self.chunk_tokens:
+            yield start, end, tokens, paragraph
+            return
+        for word in _WORD_PATTERN.finditer(text, start, end):
+            tokens = self.counter.count(word.group())
+            if tokens <= self.chunk_tokens:
+                yield word.start(), word.end(), tokens, False
+                continue
+            # A single unbroken run longer than a chunk is cut into pieces,
+            # each shrunk until its own token count fits.
+            offset = word.start()
+            while offset < word.end():
+                piece_end = min(offset + self.chunk_tokens, word.end())
+                tokens = self.counter.count(text[offset:piece_end])
+                while tokens > self.chunk_tokens and piece_end - offset > 1:
+                    piece_end = offset + max(
+                        1, (piece_end - offset) * self.chunk_tokens // tokens
+                    )
+                    tokens = self.counter.count(text[offset:piece_end])
+                yield offset, piece_end, tokens, False
+                offset = piece_end
+
+    def _cut_point(self, window: Deque[Tuple[int, int, int, bool]]) -> int:
+        """Segments to emit: up to the last paragraph end past half a chunk."""
+
+        cut = len(window)
+        filled = 0
+        for index, (_, _, tokens, paragraph) in enumerate(window, 1):
+            filled += tokens
+            if paragraph and 2 * filled >= self.chunk_tokens:
+                cut = index
+        return cut
+
+    def _overlap(
+        self, window: Deque[Tuple[int, int, int, bool]], cut: int
+    ) -> List[Tuple[int, int, int, bool]]:
+        overlap: List[Tuple[int, int, int, bool]] = []
+        budget = self.chunk_overlap
+        for index in range(cut - 1, 0, -1):
+            segment = window[index]
+            if segment[2] > budget:
+                break
+            budget -= segment[2]
+            overlap.append(segment)
+        overlap.reverse()
+        return overlap
+
+    @staticmethod
+    def _span(text: str, start: int, end: int) -> Tuple[int, int]:
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
 
 
 class PDFLoader:
-    """Extract text from PDF files stored at a path."""
+    """Extract text from PDF files stored at a path.
+
+    With ``parallel=True`` extraction is fanned out to a process pool: every
+    file is split into tasks of at most ``pages_per_task`` pages, and
+    documents are yielded in the same order as the serial loader as soon as
+    all of their pages are done. Page counts and page tasks are submitted
+    through a window of ``max_in_flight`` (default: twice the worker count)
+    files and tasks ahead of the consumer, so extracted text never piles up
+    far ahead of it; closing the iterator early cancels queued work.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        parallel: bool = False,
+        max_workers: Optional[int] = None,
+        pages_per_task: int = 32,
+        max_in_flight: Optional[int] = None,
+    ):
+        if pages_per_task <= 0:
+            raise ValueError("pages_per_task must be a positive integer")
+        if max_in_flight is not None and max_in_flight <= 0:
+            raise ValueError("max_in_flight must be a positive integer")
 
-    def __init__(self, path: str):
         self.path = Path(path)
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self.pages_per_task = pages_per_task
+        self.max_in_flight = max_in_flight
         self.documents: List[str] = []
 
     def load(self) -> None:
@@ -97,7 +440,7 @@ class PDFLoader:
     def load_file(self) -> None:
         """Load a single PDF specified by ``self.path``."""
 
-        self.documents = [self._read_pdf(self.path)]
+        self.documents = list(self._iter_files([self.path]))
 
     def load_directory(self) -> None:
         """Load all PDF files contained within ``self.path``."""
@@ -110,20 +453,93 @@ class PDFLoader:
         self.load()
         return self.documents
 
-    def _iter_documents(self) -> Iterable[str]:
+    def iter_documents(self) -> Iterator[str]:
+        """Yield documents one at a time without storing them on the loader."""
+
+        return iter(self._iter_documents())
+
+    def iter_paths(self) -> Iterator[Path]:
+        """Yield the paths of the PDF files this loader would read, in order."""
+
         if self.path.is_dir():
-            yield from self._iter_directory(self.path)
+            yield from self._iter_directory_paths(self.path)
         elif self.path.is_file() and self.path.suffix.lower() == ".pdf":
-            yield self._read_pdf(self.path)
+            yield self.path
         else:
             raise ValueError(
                 "Provided path must be a directory or a .pdf file: " f"{self.path}"
             )
 
+    def _iter_documents(self) -> Iterable[str]:
+        yield from self._iter_files(list(self.iter_paths()))
+
     def _iter_directory(self, directory: Path) -> Iterable[str]:
+        yield from self._iter_files(list(self._iter_directory_paths(directory)))
+
+    def _iter_directory_paths(self, directory: Path) -> Iterable[Path]:
         for entry in sorted(directory.rglob("*.pdf")):
             if entry.is_file():
-                yield self._read_pdf(entry)
+                yield entry
+
+    def _iter_files(self, files: List[Path]) -> Iterable[str]:
+        if not self.parallel:
+            for file_path in files:
+                yield self._read_pdf(file_path)
+            return
+
+        window = self.max_in_flight or 2 * (self.max_workers or os.cpu_count() or 1)
+        pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        remaining = iter(files)
+        # One entry per file in output order: its page-count future and, once
+        # scheduled, the futures of its page ranges.
+        queue: Deque[_PendingPDF] = deque()
+        try:
+            while True:
+                for file_path in islice(remaining, max(0, window - len(queue))):
+                    queue.append(
+                        _PendingPDF(
+                            file_path, pool.submit(_count_pdf_pages, str(file_path))
+                        )
+                    )
+                if not queue:
+                    return
+                self._schedule_pages(pool, queue, window)
+                futures = queue.popleft().pages
+                yield "\n".join(future.result() for future in futures)
+        finally:
+            for pending in queue:
+                pending.page_count.cancel()
+                for future in pending.pages or ():
+                    future.cancel()
+            pool.shutdown(wait=not queue, cancel_futures=True)
+
+    def _schedule_pages(
+        self, pool: ProcessPoolExecutor, queue: Deque["_PendingPDF"], window: int
+    ) -> None:
+        """Submit page ranges in file order while the window has room.
+
+        The head file is always scheduled (waiting for its page count); later
+        files only once their count is known and fewer than ``window`` page
+        tasks are outstanding.
+        """
+
+        outstanding = sum(len(pending.pages or ()) for pending in queue)
+        for position, pending in enumerate(queue):
+            if pending.pages is not None:
+                continue
+            if position and (outstanding >= window or not pending.page_count.done()):
+                return
+            total = pending.page_count.result()
+            pending.pages = [
+                pool.submit(
+                    _extract_pdf_pages,
+                    str(pending.file_path),
+                    start,
+                    min(start + self.pages_per_task, total),
+                )
+                for start in range(0, max(total, 1), self.pages_per_task)
+            ]
+            outstanding += len(pending.pages)
 
     def _read_pdf(self, file_path: Path) -> str:
         with file_path.open("rb") as file_handle:
@@ -132,6 +548,32 @@ class PDFLoader:
         return "\n".join(extracted_pages)
 
 
+class _PendingPDF:
+    __slots__ = ("file_path", "page_count", "pages")
+
+    def __init__(self, file_path: Path, page_count: Future):
+        self.file_path = file_path
+        self.page_count = page_count
+        self.pages: Optional[List[Future]] = None
+
+
+def _count_pdf_pages(file_path: str) -> int:
+    with open(file_path, "rb") as file_handle:
+        return len(PyPDF2.PdfReader(file_handle).pages)
+
+
+def _extract_pdf_pages(file_path: str, start: int, stop: int) -> str:
+    """Extract pages ``start:stop`` of a PDF; runs inside a worker process."""
+
+    with open(file_path, "rb") as file_handle:
+        pdf_reader = PyPDF2.PdfReader(file_handle)
+        extracted_pages = [
+            pdf_reader.pages[number].extract_text() or ""
+            for number in range(start, stop)
+        ]
+    return "\n".join(extracted_pages)
+
+
 if __name__ == "__main__":
     loader = TextFileLoader("data/KingLear.txt")
     loader.load()
@@ -0,0 +1,320 @@
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+
+# Rows decoded to float32 at a time when scanning compressed storage.
+_DECODE_CHUNK_ROWS = 16384
+
+
+class Float32Codec:
+    """Store unit rows as they are."""
+
+    name = "float32"
+    dtype = np.float32
+    is_trained = True
+
+    def check(self, dim: int) -> None:
+        """Raise ``ValueError`` if rows of ``dim`` columns cannot be stored."""
+
+    def allocate(self, capacity: int, dim: int) -> np.ndarray:
+        """Return an empty matrix for ``capacity`` rows of ``dim`` columns."""
+
+        return np.zeros((capacity, dim), dtype=self.dtype)
+
+    def write(self, matrix: np.ndarray, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Encode unit ``vectors`` into ``matrix`` at ``rows``."""
+
+        matrix[rows] = vectors
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Return stored ``codes`` as ``float32`` vectors."""
+
+        return np.asarray(codes).astype(np.float32)
+
+    def score(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Inner products of unit ``queries`` with every row of ``codes``."""
+
+        return queries @ codes.T
+
+
+class Float16Codec(Float32Codec):
+    """Store unit rows in half precision, decoded a chunk at a time."""
+
+    name = "float16"
+    dtype = np.float16
+
+    def score(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return _chunked_scores(queries, codes, self.decode)
+
+
+class Int8Codec(Float32Codec):
+    """Store unit rows as int8 with a per-dimension scale.
+
+    The scales are calibrated on the first batch and widened, with the stored
+    codes re-encoded, whenever a later batch exceeds them.
+    """
+
+    name = "int8"
+    dtype = np.int8
+
+    def __init__(self):
+        self.scales: Optional[np.ndarray] = None
+
+    def write(self, matrix: np.ndarray, rows: np.ndarray, vectors: np.ndarray) -> None:
+        peak = np.abs(vectors).max(axis=0)
+        if self.scales is None:
+            # Calibrate with headroom and a floor so a tiny first batch does
+            # not clip everything written after it.
+            floor = 4.0 / np.sqrt(vectors.shape[1])
+            peak = np.maximum(peak * 1.25, floor)
+            self.scales = np.minimum(peak, 1.0).astype(np.float32) / 127
+        elif (peak > self.scales * 127).any():
+            self._widen(matrix, peak)
+        encoded = np.clip(np.rint(vectors / self.scales), -127, 127)
+        matrix[rows] = encoded.astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.asarray(codes).astype(np.float32) * self.scales
+
+    def score(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return _chunked_scores(
+            queries * self.scales, codes, lambda block: block.astype(np.float32)
+        )
+
+    def _widen(self, matrix: np.ndarray, peak: np.ndarray) -> None:
+        widened = np.flatnonzero(peak > self.scales * 127)
+        scales = self.scales.copy()
+        scales[widened] = np.minimum(peak[widened] * 1.25, 1.0) / 127
+        ratio = self.scales[widened] / scales[widened]
+        # Every allocated row, since load() encodes before setting the size.
+        for start in range(0, matrix.shape[0], _DECODE_CHUNK_ROWS):
+            stop = min(start + _DECODE_CHUNK_ROWS, matrix.shape[0])
+            block = matrix[start:stop, widened].astype(np.float32) * ratio
+            matrix[start:stop, widened] = np.rint(block).astype(np.int8)
+        self.scales = scales
+
+
+class ProductQuantizer(Float32Codec):
+    """Store unit rows as product-quantization codes.
+
+    Each row is split into ``n_subquantizers`` slices and every slice is
+    replaced by the id of its nearest of up to 256 k-means centroids, so a
+    row costs ``n_subquantizers`` bytes. Queries are scored against the codes
+    with one inner-product table per slice (asymmetric distance).
+
+    Rows are held as ``float32`` until ``min_train_size`` have been written;
+    the codebooks are then trained on them and the matrix is re-encoded.
+    """
+
+    name = "pq"
+
+    def __init__(
+        self,
+        n_subquantizers: int = 16,
+        min_train_size: int = 4096,
+        n_iter: int = 15,
+        seed: int = 0,
+    ):
+        if n_subquantizers <= 0:
+            raise ValueError("n_subquantizers must be a positive integer")
+
+        self.n_subquantizers = n_subquantizers
+        self.min_train_size = min_train_size
+        self.n_iter = n_iter
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    @property
+    def dtype(self) -> Any:
+        return np.uint8 if self.is_trained else np.float32
+
+    def check(self, dim: int) -> None:
+        if dim % self.n_subquantizers:
+            raise ValueError(
+                f"Dimension {dim} is not divisible by "
+                f"n_subquantizers={self.n_subquantizers}"
+            )
+
+    def allocate(self, capacity: int, dim: int) -> np.ndarray:
+        if self.is_trained:
+            return np.zeros((capacity, self.n_subquantizers), dtype=np.uint8)
+        return super().allocate(capacity, dim)
+
+    def sample(self, vectors: np.ndarray) -> np.ndarray:
+        """Return the training sample of ``vectors`` as a ``float32`` array."""
+
+        rng = np.random.default_rng(self.seed)
+        size = min(vectors.shape[0], 64 * 256)
+        picks = np.sort(rng.choice(vectors.shape[0], size, replace=False))
+        return np.asarray(vectors[picks], dtype=np.float32)
+
+    def fit(self, sample: np.ndarray) -> None:
+        """Train one codebook per slice on the unit rows of ``sample``."""
+
+        self.check(sample.shape[1])
+        rng = np.random.default_rng(self.seed)
+        n_centroids = min(256, sample.shape[0])
+        self.codebooks = np.stack(
+            [
+                self._kmeans(subspace, n_centroids, rng)
+                for subspace in np.split(sample, self.n_subquantizers, axis=1)
+            ]
+        )
+
+    def write(self, matrix: np.ndarray, rows: np.ndarray, vectors: np.ndarray) -> None:
+        if not self.is_trained:
+            matrix[rows] = vectors
+            return
+        slices = np.split(vectors, self.n_subquantizers, axis=1)
+        for slot, (subspace, codebook) in enumerate(zip(slices, self.codebooks)):
+            matrix[rows, slot] = _nearest_euclidean(subspace, codebook)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        if not self.is_trained:
+            return super().decode(codes)
+        codes = np.asarray(codes)
+        return np.concatenate(
+            [self.codebooks[slot][codes[..., slot]] for slot in range(codes.shape[-1])],
+            axis=-1,
+        )
+
+    def score(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        if not self.is_trained:
+            return super().score(queries, codes)
+        tables = np.einsum(
+            "mcd,qmd->qmc",
+            self.codebooks,
+            queries.reshape(queries.shape[0], self.n_subquantizers, -1),
+        ).reshape(queries.shape[0], -1)
+        offsets = np.arange(self.n_subquantizers) * self.codebooks.shape[1]
+        scores = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+        for start in range(0, codes.shape[0], _DECODE_CHUNK_ROWS):
+            block = codes[start : start + _DECODE_CHUNK_ROWS].astype(np.intp) + offsets
+            scores[:, start : start + block.shape[0]] = tables[:, block].sum(axis=2)
+        return scores
+
+    def _kmeans(
+        self, sample: np.ndarray, n_centroids: int, rng: np.random.Generator
+    ) -> np.ndarray:
+        centroids = sample[rng.choice(sample.shape[0], n_centroids, replace=False)]
+        for _ in range(self.n_iter):
+            cells = _nearest_euclidean(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, cells, sample)
+            counts = np.bincount(cells, minlength=n_centroids)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+                counts[empty] = 1
+            centroids = (sums / counts[:, None]).astype(np.float32)
+        return centroids
+
+
+RowCodec = Union[Float32Codec, Float16Codec, Int8Codec, ProductQuantizer]
+
+_CODECS = {
+    "float32": Float32Codec,
+    "float16": Float16Codec,
+    "int8": Int8Codec,
+    "pq": ProductQuantizer,
+}
+
+
+def make_codec(storage: Union[str, ProductQuantizer]) -> RowCodec:
+    """Return a fresh codec for a ``storage`` name, or ``storage`` itself."""
+
+    if isinstance(storage, ProductQuantizer):
+        return storage
+    if storage not in _CODECS:
+        raise ValueError(
+            f"storage must be one of {sorted(_CODECS)} or a ProductQuantizer"
+        )
+    return _CODECS[storage]()
+
+
+def _chunked_scores(
+    queries: np.ndarray,
+    codes: np.ndarray,
+    decode: Callable[[np.ndarray], np.ndarray],
+) -> np.ndarray:
+    # Decode a chunk at a time so a scan never materialises a full-precision
+    # copy of the matrix.
+    scores = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+    for start in range(0, codes.shape[0], _DECODE_CHUNK_ROWS):
+        block = decode(codes[start : start + _DECODE_CHUNK_ROWS])
+        scores[:, start : start + block.shape[0]] = queries @ block.T
+    return scores
+
+
+def _nearest_euclidean(
+    vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192
+) -> np.ndarray:
+    squared = np.einsum("ij,ij->i", centroids, centroids)
+    return np.concatenate(
+        [
+            np.argmin(
+                squared - 2 * (vectors[start : start + chunk_size] @ centroids.T),
+                axis=1,
+            )
+            for start in range(0, vectors.shape[0], chunk_size)
+        ]
+    )
+
+
+def _grow(array: np.ndarray, capacity: int) -> np.ndarray:
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[: array.shape[0]] = array
+    return grown
+
+
+def _map_rows(
+    target: Union[Path, Any], capacity: int, dim: int, fresh: bool = False
+) -> np.memmap:
+    """Map ``target`` (a path or open file) as a ``(capacity, dim)`` float32
+    matrix, extending the file as needed; ``fresh`` discards its contents."""
+
+    size = capacity * dim * np.dtype(np.float32).itemsize
+    if isinstance(target, Path):
+        with target.open("wb" if fresh else "ab") as handle:
+            if os.path.getsize(target) < size:
+                handle.truncate(size)
+    else:
+        target.truncate(size)
+    return np.memmap(target, dtype=np.float32, mode="r+", shape=(capacity, dim))
+
+
+def _copy_rows(source: np.ndarray, target: np.ndarray) -> None:
+    for start in range(0, source.shape[0], _DECODE_CHUNK_ROWS):
+        stop = min(start + _DECODE_CHUNK_ROWS, source.shape[0])
+        target[start:stop] = source[start:stop]
+
+
+def _grow_rows(array: np.ndarray, capacity: int, path: Optional[Path]) -> np.ndarray:
+    """Grow a row store; memory-mapped stores grow on disk, not in memory.
+
+    A store mapping ``path`` is extended in place. Any other mapping (such as
+    a loaded vectors file) is copied a block at a time into ``path``, or into
+    an anonymous temporary file when no path is configured.
+    """
+
+    if not isinstance(array, np.memmap):
+        return _grow(array, capacity)
+    mapped = None if array.filename is None else os.path.abspath(array.filename)
+    if path is not None and mapped == os.path.abspath(path):
+        array.flush()
+        return _map_rows(path, capacity, array.shape[1])
+    target = _map_rows(
+        tempfile.TemporaryFile() if path is None else path,
+        capacity,
+        array.shape[1],
+        True,
+    )
+    _copy_rows(array, target)
+    return target
@@ -1,9 +1,60 @@
 import asyncio
-from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import numpy as np
 
 from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.query_cache import QueryCache
+from aimakerspace.vector_storage import (
+    _DECODE_CHUNK_ROWS,
+    ProductQuantizer,
+    _copy_rows,
+    _grow,
+    _grow_rows,
+    _map_rows,
+    make_codec,
+)
+
+if TYPE_CHECKING:
+    from aimakerspace.ann import IVFIndex
+
+MetadataFilter = Dict[str, Any]
+# ``(ids, vectors, texts, metadata)`` for a batch of records.
+RecordBatch = Tuple[np.ndarray, np.ndarray, List[Optional[str]], List[Dict[str, Any]]]
+
+_FORMAT_VERSION = 2
+_VECTORS_FILE = "vectors.npy"
+_NORMS_FILE = "norms.npy"
+_IDS_FILE = "ids.npy"
+_RECORDS_FILE = "records.json"
+# Exact filtered scans gather and score only the matching rows up to this
+# fraction of the store; past it, scoring every row and masking is cheaper.
+_GATHER_SCAN_SELECTIVITY = 0.5
+_RANGE_OPERATORS = {
+    "$gt": lambda value, bound: value > bound,
+    "$gte": lambda value, bound: value >= bound,
+    "$lt": lambda value, bound: value < bound,
+    "$lte": lambda value, bound: value <= bound,
+}
 
 
 def cosine_similarity(vector_a: np.ndarray, vector_b: np.ndarray) -> float:
@@ -18,36 +69,492 @@ def cosine_similarity(vector_a: np.ndarray, vector_b: np.ndarray) -> float:
     return float(dot_product / (norm_a * norm_b))
 
 
+def _normalize_rows(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return ``matrix`` scaled to unit-length rows together with the row norms.
+
+    Zero rows are left as zeros so that they score ``0.0`` against any query,
+    matching :func:`cosine_similarity`.
+    """
+
+    norms = np.linalg.norm(matrix, axis=1)
+    safe_norms = np.where(norms == 0, 1.0, norms)
+    return matrix / safe_norms[:, None], norms
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the ``k`` largest ``scores``, best first.
+
+    Works along the last axis, so a ``(queries, vectors)`` score matrix yields
+    one ranked row of indices per query.
+    """
+
+    n = scores.shape[-1]
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+class _ReadWriteLock:
+    """Shared lock for searches, exclusive lock for writes.
+
+    Waiting writers block new readers, so a steady stream of searches cannot
+    starve an insert.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
 class VectorDatabase:
-    """Minimal in-memory vector store backed by numpy arrays."""
+    """In-memory vector store backed by one contiguous, pre-normalized matrix.
+
+    Every record has a stable integer id, a unit-length row, an optional text
+    payload and optional metadata. Deleted rows are tombstoned and reclaimed
+    by :meth:`compact` once more than ``compaction_threshold`` of them are
+    dead. The key-based API (``insert``/``retrieve_from_key``) treats the
+    text as the key and resolves to the newest live record carrying it.
+
+    ``index`` (an :class:`~aimakerspace.ann.IVFIndex`) makes cosine queries
+    approximate once trained. ``storage`` picks the codec of the scanned
+    matrix from :mod:`aimakerspace.vector_storage`: ``"float32"``,
+    ``"float16"``, ``"int8"`` or ``"pq"`` (or a configured
+    ``ProductQuantizer``). Compressed stores re-rank the top
+    ``rerank_factor * k`` rows against exact rows kept with ``keep_exact``
+    (in RAM) or ``exact_path`` (on disk). ``scan_dims`` scans a renormalised
+    prefix of each vector, which suits Matryoshka embeddings.
+
+    ``filter`` matches metadata by value, by membership (a list/set or
+    ``{"$in": [...]}``) or by ``$gt``/``$gte``/``$lt``/``$lte`` ranges, e.g.
+    ``{"tenant": "acme", "date": {"$gte": "2024-01-01"}}``; list-valued fields
+    match any member. With a trained index, filters keeping at most
+    ``filter_scan_threshold`` of the records are scanned exactly and broader
+    ones post-filter the ANN results. Without one (or with ``exact=True``)
+    filtered searches are always exact.
+
+    ``query_cache`` serves repeated text queries; every write bumps
+    :attr:`version`, which invalidates cached results. Searches hold a shared
+    lock and writes an exclusive one.
+    """
+
+    def __init__(
+        self,
+        embedding_model: Optional[EmbeddingModel] = None,
+        initial_capacity: int = 1024,
+        index: Optional["IVFIndex"] = None,
+        compaction_threshold: float = 0.25,
+        filter_scan_threshold: float = 0.2,
+        storage: Union[str, ProductQuantizer] = "float32",
+        rerank_factor: int = 4,
+        scan_dims: Optional[int] = None,
+        query_cache: Optional[QueryCache] = None,
+        keep_exact: bool = False,
+        exact_path: Optional[Union[str, Path]] = None,
+    ):
+        if initial_capacity <= 0:
+            raise ValueError("initial_capacity must be a positive integer")
+        if scan_dims is not None and (scan_dims <= 0 or rerank_factor <= 0):
+            raise ValueError(
+                "scan_dims must be a positive integer and needs rerank_factor > 0"
+            )
+
+        self._embedding_model = embedding_model
+        self._initial_capacity = initial_capacity
+        self.index = index
+        self.compaction_threshold = compaction_threshold
+        self.filter_scan_threshold = filter_scan_threshold
+        self._codec = make_codec(storage)
+        self.storage = self._codec.name
+        self.rerank_factor = rerank_factor
+        self.scan_dims = scan_dims
+        self.query_cache = query_cache
+        self.keep_exact = keep_exact
+        self.exact_path = None if exact_path is None else Path(exact_path)
+        # Bumped on every write so cached results can be invalidated.
+        self.version = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._exact: Optional[np.ndarray] = None
+        self._dim: Optional[int] = None
+        self._norms: Optional[np.ndarray] = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._alive = np.empty(0, dtype=bool)
+        self._size = 0
+        self._tombstones = 0
+        self._next_id = 0
+        self._id_to_row: Dict[int, int] = {}
+        self._texts: List[Optional[str]] = []
+        self._metadata: Dict[str, List[Any]] = {}
+        self._inverted: Dict[str, Dict[Any, Set[int]]] = {}
+        # Text -> ids of the live records carrying it, oldest write first.
+        self._key_to_ids: Dict[str, Dict[int, None]] = {}
+        self._lock = _ReadWriteLock()
+
+    def __len__(self) -> int:
+        return self._size - self._tombstones
+
+    @property
+    def embedding_model(self) -> EmbeddingModel:
+        """Model for text queries, created on first use if none was given.
+
+        Vector-only use (``search``, ``upsert``, :meth:`load`) therefore never
+        needs an API key.
+        """
+
+        if self._embedding_model is None:
+            self._embedding_model = EmbeddingModel()
+        return self._embedding_model
+
+    @embedding_model.setter
+    def embedding_model(self, embedding_model: EmbeddingModel) -> None:
+        self._embedding_model = embedding_model
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._key_to_ids
+
+    @property
+    def dim(self) -> Optional[int]:
+        """Dimensionality of the stored vectors, or ``None`` while empty."""
+
+        return self._dim
 
-    def __init__(self, embedding_model: Optional[EmbeddingModel] = None):
-        self.vectors: Dict[str, np.ndarray] = {}
-        self.embedding_model = embedding_model or EmbeddingModel()
+    @property
+    def next_id(self) -> int:
+        """Id that :meth:`add` assigns to the next new record."""
+
+        return self._next_id
+
+    @property
+    def scan_nbytes(self) -> int:
+        """Bytes held by the scanned matrix for the stored rows."""
+
+        return 0 if self._matrix is None else self._matrix[: self._size].nbytes
+
+    @property
+    def ids(self) -> List[int]:
+        """Ids of all live records in storage order."""
+
+        return self._ids[: self._size][self._alive[: self._size]].tolist()
+
+    @property
+    def vectors(self) -> Dict[Union[str, int], np.ndarray]:
+        """Mapping of text (or id) to stored vector for live records."""
+
+        return {
+            self._payload(row): self._original_vector(row)
+            for row in np.flatnonzero(self._alive[: self._size])
+        }
 
     def insert(self, key: str, vector: Iterable[float]) -> None:
         """Store ``vector`` so that it can be retrieved with ``key`` later on."""
 
-        self.vectors[key] = np.asarray(vector, dtype=float)
+        self.insert_many([key], [vector])
+
+    def insert_many(
+        self, keys: Sequence[str], vectors: Iterable[Iterable[float]]
+    ) -> None:
+        """Store several keyed vectors, overwriting records with the same key."""
+
+        self._store(lambda count: self._key_ids(keys), vectors, texts=keys)
+
+    def add(
+        self,
+        vectors: Iterable[Iterable[float]],
+        texts: Optional[Sequence[Optional[str]]] = None,
+        metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    ) -> List[int]:
+        """Store new records and return the ids assigned to them.
+
+        Unlike :meth:`insert_many`, identical texts become separate records.
+        """
+
+        return self._store(self._allocate_ids, vectors, texts, metadata)
+
+    def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: Iterable[Iterable[float]],
+        texts: Optional[Sequence[Optional[str]]] = None,
+        metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    ) -> None:
+        """Insert records with the given ``ids`` or replace them in place."""
+
+        self._store(lambda count: ids, vectors, texts, metadata)
+
+    def _store(
+        self,
+        assign_ids: Callable[[int], Sequence[int]],
+        vectors: Iterable[Iterable[float]],
+        texts: Optional[Sequence[Optional[str]]] = None,
+        metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    ) -> List[int]:
+        """Write a batch under the write lock and return its ids.
+
+        ``assign_ids(count)`` runs under the lock, so ids derived from the
+        current records (new ids, key lookups) cannot be claimed twice by
+        concurrent writers.
+        """
+
+        batch = np.asarray(
+            [np.asarray(vector, dtype=np.float32) for vector in vectors],
+            dtype=np.float32,
+        )
+        if batch.shape[0] == 0:
+            return []
+        count = batch.shape[0]
+        texts = texts if texts is not None else [None] * count
+        metadata = metadata if metadata is not None else [None] * count
+        if batch.ndim != 2 or not count == len(texts) == len(metadata):
+            raise ValueError(
+                "ids, vectors, texts and metadata must have the same length"
+            )
+
+        for fields in metadata:
+            _check_metadata(fields)
+        normalized, norms = _normalize_rows(batch)
+        with self._lock.write():
+            ids = [int(record_id) for record_id in assign_ids(count)]
+            if len(ids) != count:
+                raise ValueError(
+                    "ids, vectors, texts and metadata must have the same length"
+                )
+            self._ensure_dim(batch.shape[1])
+            rows = np.empty(count, dtype=np.intp)
+            for position, (record_id, text, fields) in enumerate(
+                zip(ids, texts, metadata)
+            ):
+                row = self._id_to_row.get(record_id)
+                if row is None:
+                    row = self._append_row(record_id)
+                self._set_record(row, record_id, text, fields)
+                rows[position] = row
+
+            self.version += 1
+            self._write_rows(rows, normalized)
+            self._norms[rows] = norms
+            self._maybe_train_codec()
+            self._update_index(rows, self._project(normalized))
+        return ids
+
+    def delete(self, ids: Iterable[int]) -> int:
+        """Tombstone the records with ``ids`` and return how many existed."""
+
+        removed_rows: List[int] = []
+        with self._lock.write():
+            for record_id in ids:
+                row = self._id_to_row.pop(int(record_id), None)
+                if row is None:
+                    continue
+                self._set_record(row, int(record_id), None, None)
+                self._alive[row] = False
+                removed_rows.append(row)
+
+            self._tombstones += len(removed_rows)
+            if removed_rows:
+                self.version += 1
+            if removed_rows and self.index is not None and self.index.is_trained:
+                self.index.remove(removed_rows)
+            if self._tombstones > self.compaction_threshold * self._size:
+                self._compact()
+        return len(removed_rows)
+
+    def delete_keys(self, keys: Iterable[str]) -> int:
+        """Delete the records currently addressed by ``keys``."""
+
+        return self.delete(
+            [self._key_id(key) for key in keys if key in self._key_to_ids]
+        )
+
+    def compact(self) -> None:
+        """Drop tombstoned rows, packing live records to the front of storage."""
+
+        with self._lock.write():
+            self._compact()
+
+    def _compact(self) -> None:
+        if self._tombstones == 0:
+            return
+
+        keep = np.flatnonzero(self._alive[: self._size])
+        size = keep.shape[0]
+        self._matrix[:size] = self._matrix[keep]
+        if self._exact is not None:
+            # In place and a block at a time, so a disk-backed store is never
+            # gathered into memory; keep[i] >= i, so no source row is
+            # overwritten before it has been copied.
+            for start in range(0, size, _DECODE_CHUNK_ROWS):
+                rows = keep[start : start + _DECODE_CHUNK_ROWS]
+                self._exact[start : start + rows.shape[0]] = self._exact[rows]
+        self._norms[:size] = self._norms[keep]
+        self._ids[:size] = self._ids[keep]
+        self._alive[:size] = True
+        self._alive[size : self._size] = False
+        self._texts = [self._texts[row] for row in keep]
+        for field, column in self._metadata.items():
+            self._metadata[field] = [column[row] for row in keep]
+        self._id_to_row = {
+            int(record_id): row for row, record_id in enumerate(self._ids[:size])
+        }
+        if self.index is not None and self.index.is_trained:
+            self.index.compact(keep)
+        self._size = size
+        self._tombstones = 0
+        self._rebuild_inverted()
+
+    def retrieve(self, record_id: int) -> Optional[np.ndarray]:
+        """Return the stored vector for ``record_id`` if present."""
+
+        row = self._id_to_row.get(record_id)
+        return None if row is None else self._original_vector(row)
+
+    def get_text(self, record_id: int) -> Optional[str]:
+        """Return the text payload of ``record_id``, if any."""
+
+        row = self._id_to_row.get(record_id)
+        return None if row is None else self._texts[row]
+
+    def get_metadata(self, record_id: int) -> Optional[Dict[str, Any]]:
+        """Return the metadata fields set on ``record_id``."""
+
+        row = self._id_to_row.get(record_id)
+        return None if row is None else self._row_metadata(row)
+
+    def iter_records(self, batch_size: int = 4096) -> Iterator[RecordBatch]:
+        """Yield the live records as ``(ids, vectors, texts, metadata)`` batches.
+
+        Vectors are returned as :meth:`retrieve` returns them. Each batch is
+        read under the shared lock, so writes may interleave between batches;
+        records deleted in the meantime are skipped.
+        """
+
+        if batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer")
+
+        with self._lock.read():
+            ids = self._ids[: self._size][self._alive[: self._size]].tolist()
+        for start in range(0, len(ids), batch_size):
+            with self._lock.read():
+                batch = [
+                    i for i in ids[start : start + batch_size] if i in self._id_to_row
+                ]
+                if not batch:
+                    continue
+                rows = np.array([self._id_to_row[i] for i in batch], dtype=np.intp)
+                vectors = self._float_rows(rows) * self._norms[rows][:, None]
+                texts = [self._texts[row] for row in rows]
+                metadata = [self._row_metadata(row) for row in rows]
+            yield np.array(batch, dtype=np.int64), vectors, texts, metadata
 
     def search(
         self,
         query_vector: Iterable[float],
         k: int,
         distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        filter: Optional[MetadataFilter] = None,
     ) -> List[Tuple[str, float]]:
-        """Return the ``k`` vectors most similar to ``query_vector``."""
+        """Return the ``k`` vectors most similar to ``query_vector``.
 
-        if k <= 0:
-            raise ValueError("k must be a positive integer")
+        Cosine similarity is computed as one BLAS matrix-vector product over
+        the normalized matrix. Any other ``distance_measure`` falls back to a
+        per-vector call against the original (un-normalized) vectors.
 
-        query = np.asarray(query_vector, dtype=float)
-        scores = [
-            (key, distance_measure(query, vector))
-            for key, vector in self.vectors.items()
-        ]
-        scores.sort(key=lambda item: item[1], reverse=True)
-        return scores[:k]
+        Results are ``(text, score)`` pairs; records stored without text are
+        reported by id instead.
+        """
+
+        return self.search_batch([query_vector], k, distance_measure, filter=filter)[0]
+
+    def search_ids(
+        self,
+        query_vector: Iterable[float],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[Tuple[int, float]]:
+        """Like :meth:`search` but return ``(id, score)`` pairs."""
+
+        hits = self.search_records([query_vector], k, distance_measure, filter=filter)
+        return [(record_id, score) for record_id, score, _ in hits[0]]
+
+    def search_records(
+        self,
+        query_vectors: Iterable[Iterable[float]],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        exact: bool = False,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[int, float, Union[str, int]]]]:
+        """Like :meth:`search_batch` but return ``(id, score, payload)`` hits."""
+
+        queries = self._as_queries(query_vectors)
+        with self._lock.read():
+            return [
+                [
+                    (int(self._ids[row]), float(score), self._payload(row))
+                    for row, score in zip(rows, scores)
+                ]
+                for rows, scores in self._search_rows(
+                    queries, k, distance_measure, exact, filter
+                )
+            ]
+
+    def search_batch(
+        self,
+        query_vectors: Iterable[Iterable[float]],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        exact: bool = False,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Return the top ``k`` results for every vector in ``query_vectors``.
+
+        With cosine similarity all queries are scored together as a single
+        matrix-matrix product, which costs little more than one query. A
+        trained ``index`` is used instead unless ``exact`` is set.
+        """
+
+        queries = self._as_queries(query_vectors)
+        with self._lock.read():
+            return [
+                [(self._payload(row), float(score)) for row, score in zip(rows, scores)]
+                for rows, scores in self._search_rows(
+                    queries, k, distance_measure, exact, filter
+                )
+            ]
 
     def search_by_text(
         self,
@@ -55,28 +562,904 @@ class VectorDatabase:
         k: int,
         distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
         return_as_text: bool = False,
+        filter: Optional[MetadataFilter] = None,
+        timings: Optional[Dict[str, float]] = None,
     ) -> Union[List[Tuple[str, float]], List[str]]:
         """Vector search using an embedding generated from ``query_text``."""
 
-        query_vector = self.embedding_model.get_embedding(query_text)
-        results = self.search(query_vector, k, distance_measure)
+        return self.search_by_texts(
+            [query_text], k, distance_measure, return_as_text, filter, timings
+        )[0]
+
+    def search_by_texts(
+        self,
+        query_texts: Sequence[str],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        return_as_text: bool = False,
+        filter: Optional[MetadataFilter] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> Union[List[List[Tuple[str, float]]], List[List[str]]]:
+        """Embed ``query_texts`` in one request and search them as a batch.
+
+        A ``timings`` dict receives ``embed_ms`` (cache lookups and the
+        embedding request) and ``search_ms`` (the scan; zero when every
+        result came from the query cache).
+        """
+
+        if len(query_texts) == 0:
+            return []
+
+        start = time.perf_counter()
+        version = self.version
+        results = self._cached_results(query_texts, k, distance_measure, filter)
+        missing = [position for position, hits in enumerate(results) if hits is None]
+        if missing:
+            texts = [query_texts[position] for position in missing]
+            query_vectors = self._cached_embeddings(texts)
+            absent = [i for i, vector in enumerate(query_vectors) if vector is None]
+            if absent:
+                fetched = self.embedding_model.get_embeddings(
+                    [texts[i] for i in absent]
+                )
+                self._fill_embeddings(texts, query_vectors, absent, fetched)
+            embedded = time.perf_counter()
+            fresh = self.search_batch(query_vectors, k, distance_measure, filter=filter)
+            self._fill_results(
+                query_texts,
+                results,
+                missing,
+                fresh,
+                k,
+                distance_measure,
+                filter,
+                version,
+            )
+        else:
+            embedded = time.perf_counter()
+        if timings is not None:
+            timings["embed_ms"] = 1000 * (embedded - start)
+            timings["search_ms"] = 1000 * (time.perf_counter() - embedded)
         if return_as_text:
-            return [result[0] for result in results]
+            return [[result[0] for result in batch] for batch in results]
+        return results
+
+    async def asearch(
+        self,
+        query_vector: Iterable[float],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[Tuple[str, float]]:
+        """Async :meth:`search`; the scan runs in the loop's default executor.
+
+        NumPy releases the GIL during the matrix products, so concurrent scans
+        proceed in parallel on the executor's threads while the event loop
+        stays free. Size the pool with ``loop.set_default_executor``.
+        """
+
+        return (
+            await self.asearch_batch([query_vector], k, distance_measure, filter=filter)
+        )[0]
+
+    async def asearch_batch(
+        self,
+        query_vectors: Iterable[Iterable[float]],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        exact: bool = False,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Async :meth:`search_batch`, scored off the event loop.
+
+        The scan holds the store's read lock, so writes issued meanwhile wait
+        for it to finish rather than reshaping rows under it.
+        """
+
+        return await asyncio.to_thread(
+            self.search_batch, query_vectors, k, distance_measure, exact, filter
+        )
+
+    async def asearch_by_text(
+        self,
+        query_text: str,
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        return_as_text: bool = False,
+        filter: Optional[MetadataFilter] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> Union[List[Tuple[str, float]], List[str]]:
+        """Async :meth:`search_by_text` using the async embeddings client."""
+
+        return (
+            await self.asearch_by_texts(
+                [query_text], k, distance_measure, return_as_text, filter, timings
+            )
+        )[0]
+
+    async def asearch_by_texts(
+        self,
+        query_texts: Sequence[str],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float] = cosine_similarity,
+        return_as_text: bool = False,
+        filter: Optional[MetadataFilter] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> Union[List[List[Tuple[str, float]]], List[List[str]]]:
+        """Async :meth:`search_by_texts` using the async embeddings client."""
+
+        if len(query_texts) == 0:
+            return []
+
+        start = time.perf_counter()
+        version = self.version
+        results = self._cached_results(query_texts, k, distance_measure, filter)
+        missing = [position for position, hits in enumerate(results) if hits is None]
+        if missing:
+            texts = [query_texts[position] for position in missing]
+            query_vectors = self._cached_embeddings(texts)
+            absent = [i for i, vector in enumerate(query_vectors) if vector is None]
+            if absent:
+                fetched = await self.embedding_model.async_get_embeddings(
+                    [texts[i] for i in absent]
+                )
+                self._fill_embeddings(texts, query_vectors, absent, fetched)
+            embedded = time.perf_counter()
+            fresh = await self.asearch_batch(
+                query_vectors, k, distance_measure, filter=filter
+            )
+            self._fill_results(
+                query_texts,
+                results,
+                missing,
+                fresh,
+                k,
+                distance_measure,
+                filter,
+                version,
+            )
+        else:
+            embedded = time.perf_counter()
+        if timings is not None:
+            timings["embed_ms"] = 1000 * (embedded - start)
+            timings["search_ms"] = 1000 * (time.perf_counter() - embedded)
+        if return_as_text:
+            return [[result[0] for result in batch] for batch in results]
         return results
 
     def retrieve_from_key(self, key: str) -> Optional[np.ndarray]:
         """Return the stored vector for ``key`` if present."""
 
-        return self.vectors.get(key)
+        record_id = self._key_id(key)
+        return None if record_id is None else self.retrieve(record_id)
 
     async def abuild_from_list(self, list_of_text: List[str]) -> "VectorDatabase":
         """Populate the vector store asynchronously from raw text snippets."""
 
         embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
-        for text, embedding in zip(list_of_text, embeddings):
-            self.insert(text, embedding)
+        self.insert_many(list_of_text, embeddings)
         return self
 
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the live records to the directory ``path``.
+
+        Vectors, norms and ids are written as raw ``.npy`` arrays so that
+        :meth:`load` can memory-map them; texts and metadata columns go to a
+        small JSON side file. Every file is replaced atomically, so a store
+        may be saved back over the directory it was memory-mapped from.
+        """
+
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock.read():
+            live = np.flatnonzero(self._alive[: self._size])
+            dim = self.dim or 0
+            matrix = (
+                self._float_rows(live)
+                if self._matrix is not None
+                else np.zeros((0, dim))
+            )
+            norms = self._norms[live] if self._norms is not None else np.zeros(0)
+            _save_array(
+                directory / _VECTORS_FILE, matrix.astype(np.float32, copy=False)
+            )
+            _save_array(directory / _NORMS_FILE, norms.astype(np.float32, copy=False))
+            _save_array(directory / _IDS_FILE, self._ids[live])
+            _save_json(
+                directory / _RECORDS_FILE,
+                {
+                    "format_version": _FORMAT_VERSION,
+                    "embeddings_model_name": getattr(
+                        self._embedding_model, "embeddings_model_name", None
+                    ),
+                    "next_id": self._next_id,
+                    "scan_dims": self.scan_dims,
+                    "texts": [self._texts[row] for row in live],
+                    "metadata": {
+                        field: [column[row] for row in live]
+                        for field, column in self._metadata.items()
+                    },
+                },
+            )
+
+    @classmethod
+    def load(
+        cls,
+        path: Union[str, Path],
+        embedding_model: Optional[EmbeddingModel] = None,
+        mmap: bool = True,
+        index: Optional["IVFIndex"] = None,
+        storage: Union[str, ProductQuantizer] = "float32",
+        rerank_factor: int = 4,
+        scan_dims: Optional[int] = None,
+        keep_exact: bool = False,
+        exact_path: Optional[Union[str, Path]] = None,
+    ) -> "VectorDatabase":
+        """Load a store written by :meth:`save` without re-embedding anything.
+
+        With ``mmap`` the vectors file is mapped copy-on-write, so worker
+        processes share one page-cached copy, and it doubles as the exact
+        re-rank store of compressed or truncated scans. The other arguments
+        are as in the constructor; ``scan_dims`` defaults to the saved value.
+        """
+
+        directory = Path(path)
+        with (directory / _RECORDS_FILE).open("r", encoding="utf-8") as handle:
+            records = json.load(handle)
+        version = records.get("format_version")
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported vector store format: {version}")
+
+        texts: List[Optional[str]] = records["texts"]
+        ids = np.load(directory / _IDS_FILE).astype(np.int64)
+        metadata: Dict[str, List[Any]] = records["metadata"]
+        next_id = records["next_id"]
+        if scan_dims is None:
+            scan_dims = records.get("scan_dims")
+
+        vector_db = cls(
+            embedding_model=embedding_model,
+            index=index,
+            storage=storage,
+            rerank_factor=rerank_factor,
+            scan_dims=scan_dims,
+            keep_exact=keep_exact,
+            exact_path=exact_path,
+        )
+        vector_db._next_id = next_id
+        if texts:
+            mmap_mode = "c" if mmap else None
+            vectors = np.load(directory / _VECTORS_FILE, mmap_mode=mmap_mode)
+            if scan_dims is not None and scan_dims >= vectors.shape[1]:
+                raise ValueError(
+                    f"scan_dims={scan_dims} must be smaller than the stored "
+                    f"vector dimension {vectors.shape[1]}"
+                )
+            vector_db._dim = vectors.shape[1]
+            if vector_db.storage == "float32" and scan_dims is None:
+                vector_db._matrix = vectors
+            else:
+                codec = vector_db._codec
+                codec.check(scan_dims or vectors.shape[1])
+                if not codec.is_trained and len(texts) >= codec.min_train_size:
+                    codec.fit(vector_db._project(codec.sample(vectors)))
+                vector_db._matrix = codec.allocate(
+                    vectors.shape[0], scan_dims or vectors.shape[1]
+                )
+                for start in range(0, vectors.shape[0], _DECODE_CHUNK_ROWS):
+                    stop = min(start + _DECODE_CHUNK_ROWS, vectors.shape[0])
+                    vector_db._write_rows(
+                        np.arange(start, stop), np.asarray(vectors[start:stop])
+                    )
+                if vector_db.exact_path is not None and rerank_factor > 0:
+                    vector_db._exact = _map_rows(
+                        vector_db.exact_path, vectors.shape[0], vectors.shape[1], True
+                    )
+                    _copy_rows(vectors, vector_db._exact)
+                elif rerank_factor > 0 and (mmap or vector_db._keeps_exact()):
+                    vector_db._exact = vectors
+            vector_db._norms = np.load(directory / _NORMS_FILE, mmap_mode=mmap_mode)
+            vector_db._ids = ids
+            vector_db._alive = np.ones(len(texts), dtype=bool)
+            vector_db._size = len(texts)
+            vector_db._texts = texts
+            vector_db._metadata = metadata
+            vector_db._rebuild_inverted()
+            vector_db._id_to_row = {
+                int(record_id): row for row, record_id in enumerate(ids)
+            }
+            for text, record_id in zip(texts, ids):
+                if text is not None:
+                    vector_db._key_to_ids.setdefault(text, {})[int(record_id)] = None
+            if index is not None and len(texts) >= index.min_train_size:
+                index.fit(vector_db._decode_rows(slice(0, vector_db._size)))
+        return vector_db
+
+    def _cached_results(
+        self,
+        query_texts: Sequence[str],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float],
+        filter: Optional[MetadataFilter],
+    ) -> List[Optional[List[Tuple[str, float]]]]:
+        """Cached results per text, or ``None`` where a search is needed."""
+
+        if self.query_cache is None:
+            return [None] * len(query_texts)
+        return [
+            self.query_cache.get_results(
+                self.query_cache.results_key(text, k, distance_measure, filter),
+                self.version,
+            )
+            for text in query_texts
+        ]
+
+    def _fill_results(
+        self,
+        query_texts: Sequence[str],
+        results: List[Optional[List[Tuple[str, float]]]],
+        missing: List[int],
+        fresh: List[List[Tuple[str, float]]],
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float],
+        filter: Optional[MetadataFilter],
+        version: int,
+    ) -> None:
+        """Slot ``fresh`` results into ``results`` and cache them."""
+
+        for position, hits in zip(missing, fresh):
+            results[position] = hits
+            if self.query_cache is not None:
+                key = self.query_cache.results_key(
+                    query_texts[position], k, distance_measure, filter
+                )
+                self.query_cache.set_results(key, version, hits)
+
+    def _cached_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        if self.query_cache is None:
+            return [None] * len(texts)
+        return [self.query_cache.get_embedding(text) for text in texts]
+
+    def _fill_embeddings(
+        self,
+        texts: List[str],
+        vectors: List[Optional[List[float]]],
+        absent: List[int],
+        fetched: List[List[float]],
+    ) -> None:
+        for i, vector in zip(absent, fetched):
+            vectors[i] = vector
+            if self.query_cache is not None:
+                self.query_cache.set_embedding(texts[i], vector)
+
+    def _search_rows(
+        self,
+        queries: np.ndarray,
+        k: int,
+        distance_measure: Callable[[np.ndarray, np.ndarray], float],
+        exact: bool,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Return ranked ``(rows, scores)`` arrays for each query."""
+
+        if k <= 0:
+            raise ValueError("k must be a positive integer")
+        candidates = None if filter is None else self._filter_rows(filter)
+        if (
+            len(self) == 0
+            or queries.shape[0] == 0
+            or (candidates is not None and candidates.shape[0] == 0)
+        ):
+            empty = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32))
+            return [empty for _ in range(queries.shape[0])]
+
+        if distance_measure is not cosine_similarity:
+            rows = (
+                np.flatnonzero(self._alive[: self._size])
+                if candidates is None
+                else candidates
+            )
+            scores = np.array(
+                [
+                    [
+                        distance_measure(query, self._original_vector(row))
+                        for row in rows
+                    ]
+                    for query in queries
+                ],
+                dtype=np.float64,
+            )
+            return self._rank(scores, k, rows)
+
+        self._check_query_shape(queries)
+        normalized, _ = _normalize_rows(queries)
+        if self._exact is None:
+            return self._cosine_rows(normalized, k, exact, candidates)
+        shortlist = self._cosine_rows(
+            self._project(normalized), k * self.rerank_factor, exact, candidates
+        )
+        return self._rerank(normalized, k, shortlist)
+
+    def _cosine_rows(
+        self,
+        normalized: np.ndarray,
+        k: int,
+        exact: bool,
+        candidates: Optional[np.ndarray],
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Rank rows of the scanned store by cosine similarity."""
+
+        use_index = self.index is not None and self.index.is_trained and not exact
+        selectivity = 1.0 if candidates is None else candidates.shape[0] / len(self)
+
+        if use_index and selectivity > self.filter_scan_threshold:
+            if candidates is None:
+                return self.index.search(self._score_query, normalized, k)
+            return self._post_filtered_index_search(
+                normalized, k, candidates, selectivity
+            )
+        if candidates is not None and selectivity <= _GATHER_SCAN_SELECTIVITY:
+            return self._scan_rows(normalized, k, candidates)
+
+        scores = self._score_rows(normalized)
+        if candidates is not None:
+            excluded = np.ones(self._size, dtype=bool)
+            excluded[candidates] = False
+            scores[:, excluded] = -np.inf
+        elif self._tombstones:
+            scores[:, ~self._alive[: self._size]] = -np.inf
+        limit = len(self) if candidates is None else candidates.shape[0]
+        ranked = _top_k_indices(scores, min(k, limit))
+        return [
+            (query_rows, query_scores[query_rows])
+            for query_scores, query_rows in zip(scores, ranked)
+        ]
+
+    def _scan_rows(
+        self, normalized: np.ndarray, k: int, rows: np.ndarray
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Exactly score ``normalized`` queries against ``rows`` only."""
+
+        return self._rank(self._score_rows(normalized, rows), k, rows)
+
+    def _rerank(
+        self,
+        normalized: np.ndarray,
+        k: int,
+        shortlist: List[Tuple[np.ndarray, np.ndarray]],
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Re-score each shortlist against the exact rows and keep ``k``."""
+
+        results: List[Tuple[np.ndarray, np.ndarray]] = []
+        for query, (rows, _) in zip(normalized, shortlist):
+            order = np.sort(rows)
+            scores = np.asarray(self._exact[order], dtype=np.float32) @ query
+            best = _top_k_indices(scores, min(k, order.shape[0]))
+            results.append((order[best], scores[best]))
+        return results
+
+    def _score_rows(
+        self, normalized: np.ndarray, rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Score queries against ``rows`` (default: every row) of the store."""
+
+        source = self._matrix[: self._size] if rows is None else self._matrix[rows]
+        return self._codec.score(normalized, source)
+
+    def _score_query(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Score a single normalised query against ``rows``; used by indexes."""
+
+        return self._score_rows(query[None, :], rows)[0]
+
+    def _write_rows(self, rows: np.ndarray, normalized: np.ndarray) -> None:
+        """Store normalised vectors at ``rows`` in the configured encoding."""
+
+        if self._exact is not None:
+            self._exact[rows] = normalized
+        self._codec.write(self._matrix, rows, self._project(normalized))
+
+    def _maybe_train_codec(self) -> None:
+        """Train a product quantizer once enough rows exist and encode them."""
+
+        codec = self._codec
+        if codec.is_trained or len(self) < codec.min_train_size:
+            return
+        codec.fit(codec.sample(self._matrix[: self._size]))
+        staged = self._matrix
+        self._matrix = codec.allocate(*staged.shape)
+        for start in range(0, self._size, _DECODE_CHUNK_ROWS):
+            rows = np.arange(start, min(start + _DECODE_CHUNK_ROWS, self._size))
+            codec.write(self._matrix, rows, staged[rows])
+
+    def _keeps_exact(self) -> bool:
+        """Whether new stores hold exact ``float32`` rows for re-ranking."""
+
+        if self.rerank_factor <= 0:
+            return False
+        if self.scan_dims is not None:
+            return True
+        return self.storage != "float32" and (
+            self.keep_exact or self.exact_path is not None
+        )
+
+    def _project(self, normalized: np.ndarray) -> np.ndarray:
+        """Map full normalised vectors into the (possibly truncated) scan space."""
+
+        if self.scan_dims is None:
+            return normalized
+        return _normalize_rows(normalized[:, : self.scan_dims])[0]
+
+    def _float_rows(self, rows) -> np.ndarray:
+        """Return normalised ``float32`` vectors for ``rows``."""
+
+        if self._exact is not None:
+            return np.asarray(self._exact[rows], dtype=np.float32)
+        return self._decode_rows(rows)
+
+    def _decode_rows(self, rows) -> np.ndarray:
+        """Return scanned-matrix rows decoded to ``float32``."""
+
+        return self._codec.decode(self._matrix[rows])
+
+    def _post_filtered_index_search(
+        self,
+        normalized: np.ndarray,
+        k: int,
+        candidates: np.ndarray,
+        selectivity: float,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Over-fetch from the ANN index and keep rows passing the filter.
+
+        Queries that still end up with fewer than ``k`` hits are re-run as an
+        exact scan of the candidate rows.
+        """
+
+        allowed = np.zeros(self._size, dtype=bool)
+        allowed[candidates] = True
+        fetch = min(len(self), int(np.ceil(2 * k / selectivity)))
+        target = min(k, candidates.shape[0])
+        results: List[Tuple[np.ndarray, np.ndarray]] = []
+        for query, (rows, scores) in zip(
+            normalized, self.index.search(self._score_query, normalized, fetch)
+        ):
+            keep = allowed[rows]
+            rows, scores = rows[keep][:k], scores[keep][:k]
+            if rows.shape[0] < target:
+                rows, scores = self._scan_rows(query[None, :], k, candidates)[0]
+            results.append((rows, scores))
+        return results
+
+    def _rank(
+        self, scores: np.ndarray, k: int, rows: np.ndarray
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        ranked = _top_k_indices(scores, min(k, rows.shape[0]))
+        return [
+            (rows[positions], query_scores[positions])
+            for query_scores, positions in zip(scores, ranked)
+        ]
+
+    def _filter_rows(self, filter: MetadataFilter) -> np.ndarray:
+        """Return the live rows matching every condition in ``filter``."""
+
+        mask = self._alive[: self._size].copy()
+        for field, condition in filter.items():
+            postings = self._inverted.get(field, {})
+            field_mask = np.zeros(self._size, dtype=bool)
+            for value in _matching_values(postings, condition):
+                field_mask[np.fromiter(postings[value], dtype=np.intp)] = True
+            mask &= field_mask
+        return np.flatnonzero(mask)
+
+    def _rebuild_inverted(self) -> None:
+        self._inverted = {}
+        for field, column in self._metadata.items():
+            for row, value in enumerate(column):
+                if value is not None:
+                    self._index_value(field, value, row)
+
+    def _index_value(self, field: str, value: Any, row: int) -> None:
+        postings = self._inverted.setdefault(field, {})
+        for member in _indexed_values(value):
+            postings.setdefault(member, set()).add(row)
+
+    def _unindex_value(self, field: str, value: Any, row: int) -> None:
+        postings = self._inverted.get(field, {})
+        for member in _indexed_values(value):
+            rows = postings.get(member)
+            if rows is None:
+                continue
+            rows.discard(row)
+            if not rows:
+                del postings[member]
+
+    def _as_queries(self, query_vectors: Iterable[Iterable[float]]) -> np.ndarray:
+        return np.asarray(
+            [np.asarray(query, dtype=np.float32) for query in query_vectors],
+            dtype=np.float32,
+        )
+
+    def _allocate_ids(self, count: int) -> List[int]:
+        # Only called under the write lock; appending the rows then moves
+        # ``_next_id`` past them before any other writer can allocate.
+        return list(range(self._next_id, self._next_id + count))
+
+    def _key_ids(self, keys: Sequence[str]) -> List[int]:
+        """Ids for ``keys``: the live record carrying each, else a new one."""
+
+        ids: List[int] = []
+        assigned: Dict[str, int] = {}
+        next_id = self._next_id
+        for key in keys:
+            record_id = assigned.get(key, self._key_id(key))
+            if record_id is None:
+                record_id = next_id
+                next_id += 1
+            assigned[key] = record_id
+            ids.append(record_id)
+        return ids
+
+    def _key_id(self, key: str) -> Optional[int]:
+        """Id of the most recently written live record with text ``key``."""
+
+        holders = self._key_to_ids.get(key)
+        return next(reversed(holders)) if holders else None
+
+    def _row_metadata(self, row: int) -> Dict[str, Any]:
+        return {
+            field: column[row]
+            for field, column in self._metadata.items()
+            if column[row] is not None
+        }
+
+    def _payload(self, row: int) -> Union[str, int]:
+        text = self._texts[row]
+        return int(self._ids[row]) if text is None else text
+
+    def _append_row(self, record_id: int) -> int:
+        row = self._size
+        self._reserve(row + 1)
+        self._size += 1
+        self._ids[row] = record_id
+        self._alive[row] = True
+        self._id_to_row[record_id] = row
+        self._next_id = max(self._next_id, record_id + 1)
+        self._texts.append(None)
+        for column in self._metadata.values():
+            column.append(None)
+        return row
+
+    def _set_record(
+        self,
+        row: int,
+        record_id: int,
+        text: Optional[str],
+        fields: Optional[Dict[str, Any]],
+    ) -> None:
+        previous_text = self._texts[row]
+        if previous_text is not None:
+            holders = self._key_to_ids[previous_text]
+            del holders[record_id]
+            if not holders:
+                del self._key_to_ids[previous_text]
+        self._texts[row] = text
+        if text is not None:
+            self._key_to_ids.setdefault(text, {})[record_id] = None
+
+        for field, column in self._metadata.items():
+            if column[row] is not None:
+                self._unindex_value(field, column[row], row)
+                column[row] = None
+        for field, value in (fields or {}).items():
+            column = self._metadata.get(field)
+            if column is None:
+                column = self._metadata[field] = [None] * self._size
+            column[row] = value
+            if value is not None:
+                self._index_value(field, value, row)
+
+    def _update_index(self, rows: np.ndarray, normalized: np.ndarray) -> None:
+        if self.index is None:
+            return
+        if self.index.is_trained:
+            self.index.add(rows, normalized)
+        elif len(self) >= self.index.min_train_size:
+            self.index.fit(self._decode_rows(slice(0, self._size)))
+            dead = np.flatnonzero(~self._alive[: self._size])
+            if dead.shape[0]:
+                self.index.remove(dead.tolist())
+
+    def _check_query_shape(self, queries: np.ndarray) -> None:
+        if queries.ndim != 2 or queries.shape[1] != self.dim:
+            raise ValueError(
+                f"Queries have shape {queries.shape}, expected (n, {self.dim})"
+            )
+
+    def _original_vector(self, row: int) -> np.ndarray:
+        return self._float_rows(row) * self._norms[row]
+
+    def _ensure_dim(self, dim: int) -> None:
+        if self._matrix is None:
+            if self.scan_dims is not None and self.scan_dims >= dim:
+                raise ValueError(
+                    f"scan_dims={self.scan_dims} must be smaller than the "
+                    f"vector dimension {dim}"
+                )
+            self._codec.check(self.scan_dims or dim)
+            shape = (self._initial_capacity, dim)
+            self._matrix = self._codec.allocate(
+                self._initial_capacity, self.scan_dims or dim
+            )
+            self._dim = dim
+            if self._keeps_exact():
+                self._exact = (
+                    np.zeros(shape, dtype=np.float32)
+                    if self.exact_path is None
+                    else _map_rows(self.exact_path, *shape, True)
+                )
+            self._norms = np.zeros(self._initial_capacity, dtype=np.float32)
+            self._ids = np.zeros(self._initial_capacity, dtype=np.int64)
+            self._alive = np.zeros(self._initial_capacity, dtype=bool)
+        elif dim != self.dim:
+            raise ValueError(f"Vector has dimension {dim}, expected {self.dim}")
+
+    def _reserve(self, size: int) -> None:
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+
+        while capacity < size:
+            capacity = max(1, capacity) * 2
+        self._matrix = _grow(self._matrix, capacity)
+        if self._exact is not None:
+            self._exact = _grow_rows(self._exact, capacity, self.exact_path)
+        self._norms = _grow(self._norms, capacity)
+        self._ids = _grow(self._ids, capacity)
+        self._alive = _grow(self._alive, capacity)
+
+
+def _save_array(path: Path, array: np.ndarray) -> None:
+    # Write beside the target and rename, leaving any live mapping of the old
+    # file intact instead of truncating it underneath the reader.
+    staging = path.with_name(path.name + ".tmp")
+    with staging.open("wb") as handle:
+        np.save(handle, array)
+    os.replace(staging, path)
+
+
+def _save_json(path: Path, payload: Dict[str, Any]) -> None:
+    # Same rename dance as ``_save_array``, so a crash mid-write leaves the
+    # previous side file readable rather than a truncated one.
+    staging = path.with_name(path.name + ".tmp")
+    with staging.open("w", encoding="utf-8") as handle:
+        json.dump(payload, handle, ensure_ascii=False, separators=(",", ":"))
+    os.replace(staging, path)
+
+
+def _indexed_values(value: Any) -> Iterable[Any]:
+    """The inverted-index keys of a metadata value: a collection's members."""
+
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return value
+    return (value,)
+
+
+def _check_metadata(fields: Optional[Dict[str, Any]]) -> None:
+    for field, value in (fields or {}).items():
+        for member in _indexed_values(value):
+            try:
+                hash(member)
+            except TypeError:
+                raise ValueError(
+                    f"Metadata field {field!r} has an unhashable value {member!r}; "
+                    "use hashable values or a list of them"
+                ) from None
+
+
+def _matching_values(postings: Dict[Any, Set[int]], condition: Any) -> List[Any]:
+    """Return the indexed values of one field that satisfy ``condition``."""
+
+    if isinstance(condition, dict):
+        unknown = set(condition) - set(_RANGE_OPERATORS) - {"$eq", "$in"}
+        if unknown:
+            raise ValueError(f"Unsupported filter operators: {sorted(unknown)}")
+        if "$eq" in condition:
+            values = [condition["$eq"]]
+        elif "$in" in condition:
+            values = list(condition["$in"])
+        else:
+            values = list(postings)
+        ranges = [
+            (op, bound) for op, bound in condition.items() if op in _RANGE_OPERATORS
+        ]
+        matched = []
+        for value in values:
+            try:
+                if all(_RANGE_OPERATORS[op](value, bound) for op, bound in ranges):
+                    matched.append(value)
+            except TypeError:
+                continue
+        return [value for value in matched if value in postings]
+    if isinstance(condition, (list, tuple, set, frozenset)):
+        return [value for value in condition if value in postings]
+    return [condition] if condition in postings else []
+
+
+class QueryBatcher:
+    """Coalesce concurrent text queries into batched embedding and search calls.
+
+    Queries that arrive within ``max_delay`` seconds of each other (or until
+    ``max_batch_size`` are pending) are embedded with one
+    ``async_get_embeddings`` request and scored with one
+    :meth:`VectorDatabase.search_batch` call, so an async server can use
+    batching without changing its per-request code.
+    """
+
+    def __init__(
+        self,
+        vector_db: VectorDatabase,
+        max_batch_size: int = 64,
+        max_delay: float = 0.005,
+    ):
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be a positive integer")
+
+        self.vector_db = vector_db
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._pending: List[Tuple[str, int, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def search_by_text(
+        self, query_text: str, k: int, return_as_text: bool = False
+    ) -> Union[List[Tuple[str, float]], List[str]]:
+        """Queue ``query_text`` for the next batch and await its results."""
+
+        if k <= 0:
+            raise ValueError("k must be a positive integer")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query_text, k, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+
+        results = await future
+        if return_as_text:
+            return [result[0] for result in results]
+        return results
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, int, asyncio.Future]]) -> None:
+        try:
+            query_vectors = await self.vector_db.embedding_model.async_get_embeddings(
+                [query_text for query_text, _, _ in batch]
+            )
+            results = await self.vector_db.asearch_batch(
+                query_vectors, max(k for _, k, _ in batch)
+            )
+        except Exception as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, k, future), query_results in zip(batch, results):
+            if not future.done():
+                future.set_result(query_results[:k])
+
 
 if __name__ == "__main__":
     list_of_text = [